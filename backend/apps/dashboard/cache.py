@@ -0,0 +1,75 @@
+"""Response cache for the dashboard endpoints.
+
+Entries are keyed by a cache generation, the endpoint, today's date and the
+request URL (host and sorted query params, since payloads carry absolute
+links). ``invalidate`` bumps the generation, which drops every variant at
+once; it runs wherever a dashboard ``data.changed`` event is published.
+
+A miss is recomputed by one request only: the first one takes a short lock
+with ``cache.add`` while the others poll for its result, so a burst of
+refetches after a ``data.changed`` event costs one database computation.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+TIMEOUT = 60
+LOCK_TIMEOUT = 10
+POLL_INTERVAL = 0.05
+MAX_WAIT = 2.0
+GENERATION_KEY = "dashboard:generation"
+
+
+def generation():
+    return cache.get_or_set(GENERATION_KEY, time.time_ns, None)
+
+
+def invalidate():
+    _bump()
+    # Again after commit, so a request racing the transaction cannot keep stale data
+    transaction.on_commit(_bump)
+
+
+def _bump():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def cache_key(name, request):
+    params = sorted(request.GET.lists())
+    url = f"{request.scheme}://{request.get_host()}{request.path}?{params}"
+    digest = hashlib.md5(url.encode(), usedforsecurity=False).hexdigest()
+    return f"dashboard:{generation()}:{name}:{timezone.localdate()}:{digest}"
+
+
+def get_or_compute(key, compute):
+    value = cache.get(key)
+    if value is not None:
+        return value
+    lock = f"{key}:lock"
+    deadline = time.monotonic() + MAX_WAIT
+    while not cache.add(lock, 1, LOCK_TIMEOUT):
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if time.monotonic() >= deadline:
+            # The lock holder is slow or gone: answer without the cache
+            return compute()
+    try:
+        value = cache.get(key)
+        if value is None:
+            value = compute()
+            cache.set(key, value, TIMEOUT)
+    finally:
+        cache.delete(lock)
+    return value
+
+
+def cached(name, request, compute):
+    return get_or_compute(cache_key(name, request), lambda: compute(request))
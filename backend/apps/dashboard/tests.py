@@ -0,0 +1,110 @@
+from datetime import date
+from django.db import connection
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from django.contrib.auth import get_user_model
+from apps.fleet.models import BusType, Bus
+from apps.people.models import Client
+from apps.trips.allocation import bulk_assign
+from apps.trips.models import Trip, TripSeat, Reservation
+from . import cache as dashboard_cache
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "dashboard-tests"}}
+
+
+class TestDashboardSummary(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        self.bus = Bus.objects.create(plate="D1", bus_type=bt)
+        self.user = get_user_model().objects.create_user("dash", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_trips(self, n):
+        today = timezone.localdate()
+        for _ in range(n):
+            trip = Trip.objects.create(trip_date=today, origin="A", destination="B", bus=self.bus)
+            contact = Client.objects.create(first_name="C", last_name="D")
+            url = reverse("trip-reserve", args=[trip.id])
+            resp = self.client.post(url, {"quantity": 1, "contact_client_id": str(contact.id)}, format="json")
+            self.assertEqual(resp.status_code, 201)
+            seat = TripSeat.objects.get(trip=trip, seat_no=4)
+            seat.blocked = True
+            seat.save()
+        Trip.objects.create(trip_date=date(2001, 1, 1), origin="A", destination="B", bus=self.bus)
+
+    def summary_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/dashboard/summary")
+        self.assertEqual(resp.status_code, 200)
+        return resp.data, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_trips(self):
+        self.add_trips(1)
+        data, baseline = self.summary_queries()
+        self.assertEqual(data["seats_available_today"], 2)
+
+        self.add_trips(20)
+        data, queries = self.summary_queries()
+        self.assertEqual(queries, baseline)
+        self.assertEqual(data["seats_available_today"], 21 * 2)
+        self.assertEqual(data["total_trips"], 23)
+        self.assertEqual(data["active_reservations"], Reservation.objects.count())
+
+
+@override_settings(CACHES=LOCMEM)
+class TestDashboardCacheStampede(SimpleTestCase):
+    def test_burst_of_misses_computes_once(self):
+        calls = []
+        lock = threading.Lock()
+
+        def compute():
+            with lock:
+                calls.append(1)
+            time.sleep(0.2)
+            return {"value": 42}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: dashboard_cache.get_or_compute("dashboard:test", compute), range(8)))
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"value": 42}] * 8)
+
+
+@override_settings(CACHES=LOCMEM)
+class TestDashboardCache(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user("dc", password="p"))
+
+    def test_cached_until_data_changes(self):
+        url = "/api/dashboard/recent-clients"
+        Client.objects.create(first_name="Old", last_name="C")
+        self.client.get(url + "?limit=1")
+        with self.assertNumQueries(0):
+            resp = self.client.get(url + "?limit=1")
+        self.assertEqual(resp.data["clients"][0]["first_name"], "Old")
+        self.assertEqual(len(self.client.get(url + "?limit=2").data["clients"]), 1)
+
+        Client.objects.create(first_name="New", last_name="C")  # emits data.changed
+        self.assertEqual(self.client.get(url + "?limit=1").data["clients"][0]["first_name"], "New")
+
+    def test_seat_changes_without_data_changed_event_refresh_summary(self):
+        bus = Bus.objects.create(plate="D2", bus_type=BusType.objects.create(name="Mini", seats_count=4))
+        trip = Trip.objects.create(trip_date=timezone.localdate(), origin="A", destination="B", bus=bus)
+        user = get_user_model().objects.get(username="dc")
+        reservation = Reservation.objects.create(trip=trip, quantity=1, created_by=user, updated_by=user)
+        url = "/api/dashboard/summary"
+        self.assertEqual(self.client.get(url).data["seats_available_today"], 4)
+
+        bulk_assign(reservation, [1])
+        self.assertEqual(self.client.get(url).data["seats_available_today"], 3)
+        seat = TripSeat.objects.get(trip=trip, seat_no=2)
+        seat.blocked = True
+        seat.save()
+        self.assertEqual(self.client.get(url).data["seats_available_today"], 2)
@@ -2,41 +2,53 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.utils import timezone
 from datetime import timedelta
+from django.db.models import Sum
 from apps.people.models import Client
-from apps.trips.models import Trip, Reservation, TripSeat, SeatAssignment
+from apps.trips.models import Trip, Reservation, TripOccupancy
 from apps.people.serializers import ClientSerializer
 from apps.trips.serializers import TripSerializer
+from . import cache as dashboard_cache
 
 @api_view(["GET"])
 def summary(request):
+    return Response(dashboard_cache.cached("summary", request, _summary))
+
+
+def _summary(request):
     today = timezone.localdate()
     total_clients = Client.objects.count()
     total_trips = Trip.objects.count()
     active_reservations = Reservation.objects.exclude(status="CANCELLED").count()
-    seats_available_today = 0
-    for trip in Trip.objects.filter(trip_date=today):
-        total_seats = TripSeat.objects.filter(trip=trip, blocked=False).count()
-        booked = SeatAssignment.objects.filter(trip=trip).count()
-        seats_available_today += max(total_seats - booked, 0)
+    seats_available_today = TripOccupancy.objects.filter(trip__trip_date=today).aggregate(
+        free=Sum("free_count")
+    )["free"] or 0
     data = {
         "total_clients": total_clients,
         "total_trips": total_trips,
         "active_reservations": active_reservations,
         "seats_available_today": seats_available_today,
     }
-    return Response(data)
+    return data
 
 @api_view(["GET"])
 def upcoming_trips(request):
+    return Response(dashboard_cache.cached("upcoming-trips", request, _upcoming_trips))
+
+
+def _upcoming_trips(request):
     today = timezone.localdate()
     end = today + timedelta(days=7)
     trips = Trip.objects.filter(trip_date__range=(today, end)).order_by("trip_date")
     data = TripSerializer(trips, many=True, context={"request": request}).data
-    return Response({"trips": data})
+    return {"trips": data}
 
 @api_view(["GET"])
 def recent_clients(request):
+    return Response(dashboard_cache.cached("recent-clients", request, _recent_clients))
+
+
+def _recent_clients(request):
     limit = int(request.query_params.get("limit", 5))
     clients = Client.objects.order_by("-updated_at")[:limit]
     data = ClientSerializer(clients, many=True, context={"request": request}).data
-    return Response({"clients": data})
+    return {"clients": data}
@@ -0,0 +1,14 @@
+from rest_framework.pagination import CursorPagination
+
+
+class QuerysetOrderedCursorPagination(CursorPagination):
+    """Cursor pagination that keeps the view queryset's ordering.
+
+    DRF's default cursor ordering is ``-created``, which none of the models
+    have. The queryset's ``order_by`` is used instead, then the model's
+    ``Meta.ordering``, then the primary key.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        return tuple(ordering or queryset.model._meta.ordering or ["pk"])
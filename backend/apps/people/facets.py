@@ -0,0 +1,75 @@
+"""Facet counts for the clients list.
+
+``counts`` takes the list's filtered queryset and returns, in one query,
+how many clients fall under each nationality, active flag, birth decade and
+tag, plus the total. It groups by ``GROUPING SETS`` over the clients joined
+with ``unnest(tags) WITH ORDINALITY``: tag groups count every (client, tag)
+row, the other groups count each client once through its first tag row (or
+its only row when it has no tags). Results are cached briefly per query
+string, keyed on the dashboard cache generation, which every client change
+already bumps (see ``apps.people.signals``).
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import IntegerField
+from django.db.models.functions import Cast, ExtractYear
+
+from apps.dashboard import cache as dashboard_cache
+
+TIMEOUT = 30
+
+SQL = """
+    SELECT c.nationality, c.is_active, c.birth_decade, t.tag,
+           GROUPING(c.nationality, c.is_active, c.birth_decade, t.tag) AS grouping_id,
+           COUNT(*) AS tagged,
+           COUNT(*) FILTER (WHERE t.ord IS NULL OR t.ord = 1) AS clients
+    FROM ({inner}) c
+    LEFT JOIN LATERAL unnest(c.tags) WITH ORDINALITY AS t(tag, ord) ON true
+    GROUP BY GROUPING SETS ((c.nationality), (c.is_active), (c.birth_decade), (t.tag), ())
+"""
+# GROUPING() sets a bit for every column left out of the row's grouping set
+FACETS = {0b0111: "nationality", 0b1011: "is_active", 0b1101: "birth_decade", 0b1110: "tags"}
+TOTAL = 0b1111
+
+
+def counts(queryset):
+    inner = (
+        queryset.order_by()
+        .annotate(birth_decade=Cast(ExtractYear("birth_date"), IntegerField()) / 10 * 10)
+        .values("nationality", "is_active", "birth_decade", "tags")
+    )
+    sql, params = inner.query.sql_with_params()
+    result = {"total": 0, **{name: [] for name in FACETS.values()}}
+    with connection.cursor() as cursor:
+        cursor.execute(SQL.format(inner=sql), params)
+        for nationality, is_active, decade, tag, grouping, tagged, clients in cursor.fetchall():
+            if grouping == TOTAL:
+                result["total"] = clients
+                continue
+            facet = FACETS[grouping]
+            value = {"nationality": nationality, "is_active": is_active, "birth_decade": decade, "tags": tag}[facet]
+            if facet == "tags":
+                if tag is not None:
+                    result["tags"].append({"value": tag, "count": tagged})
+            else:
+                result[facet].append({"value": value, "count": clients})
+    for name in FACETS.values():
+        result[name].sort(key=lambda item: (-item["count"], str(item["value"])))
+    return result
+
+
+def cache_key(request):
+    params = sorted(request.query_params.lists())
+    digest = hashlib.md5(repr(params).encode(), usedforsecurity=False).hexdigest()
+    return f"people:facets:{dashboard_cache.generation()}:{digest}"
+
+
+def cached_counts(request, queryset):
+    key = cache_key(request)
+    result = cache.get(key)
+    if result is None:
+        result = counts(queryset)
+        cache.set(key, result, TIMEOUT)
+    return result
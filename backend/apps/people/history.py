@@ -0,0 +1,140 @@
+"""Client travel history, one keyset-paginated query per page.
+
+Three branches are combined with ``UNION ALL``: seats the client travels in,
+seats on reservations the client booked for others, and the client's
+reservations without seats. Each branch is filtered, cut at the cursor and
+limited on its own before the union is ordered and limited again, so a page
+returns and transfers at most ``limit`` rows, and rows before the cursor are
+skipped.
+
+Reservations and seat assignments carry a copy of their trip's date, so
+every branch walks a ``(client, trip date, ...)`` index from the cursor in
+key order and stops once it has a page: seats by passenger
+(``trips_seat_client_date_idx``), and the client's reservations
+(``trips_res_contact_date_idx``) for the other two. The cost of a page does
+not depend on the length of the history, except that the second and third
+branches step over the client's own seats and seated reservations they
+exclude.
+
+Rows are ordered by ``(trip date, reservation, seat)``; the cursor is the
+key of the last row of a page.
+"""
+import base64
+import binascii
+import uuid
+from datetime import date
+
+from django.db.models import F, IntegerField, Q, Value
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound, ValidationError
+
+from apps.trips.models import Reservation, SeatAssignment
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+ORDERING = ("trip_day", "reservation_ref", "seat_key")
+
+
+def _seat_rows(queryset, day="trip_date"):
+    return queryset.values(
+        trip_ref=F("trip_id"),
+        trip_day=F(day),
+        destination=F("trip__destination"),
+        reservation_ref=F("reservation_id"),
+        seat=F("seat_no"),
+        seat_key=F("seat_no"),
+        reservation_status=F("reservation__status"),
+    )
+
+
+def _reservation_rows(queryset):
+    return queryset.values(
+        trip_ref=F("trip_id"),
+        trip_day=F("trip_date"),
+        destination=F("trip__destination"),
+        reservation_ref=F("id"),
+        seat=Value(None, output_field=IntegerField()),
+        seat_key=Value(0, output_field=IntegerField()),
+        reservation_status=F("status"),
+    )
+
+
+def encode_cursor(row):
+    key = f"{row['trip_day'].isoformat()}|{row['reservation_ref']}|{row['seat_key']}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        day, reservation, seat = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(day), uuid.UUID(reservation), int(seat)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise NotFound("Invalid cursor")
+
+
+def _after(key):
+    day, reservation, seat = key
+    # The leading range on the date gives the index scan its start
+    return Q(trip_day__gte=day) & (
+        Q(trip_day__gt=day)
+        | Q(trip_day=day, reservation_ref__gt=reservation)
+        | Q(trip_day=day, reservation_ref=reservation, seat_key__gt=seat)
+    )
+
+
+def _parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValidationError({name: "expected YYYY-MM-DD"})
+    return parsed
+
+
+def page(client, params, limit=PAGE_SIZE):
+    """One page of ``client``'s history; returns ``(rows, next_cursor)``."""
+    date_from, date_to = _parse_date(params, "date_from"), _parse_date(params, "date_to")
+
+    def dates(prefix=""):
+        # Filter on the date column of the index the branch walks
+        q = Q()
+        if date_from:
+            q &= Q(**{f"{prefix}trip_date__gte": date_from})
+        if date_to:
+            q &= Q(**{f"{prefix}trip_date__lte": date_to})
+        return q
+
+    statuses = [s for s in params.get("status", "").upper().split(",") if s]
+    seats = SeatAssignment.objects.all()
+    reservations = Reservation.objects.all()
+    if statuses:
+        seats = seats.filter(reservation__status__in=statuses)
+        reservations = reservations.filter(status__in=statuses)
+    branches = [
+        _seat_rows(seats.filter(dates(), passenger_client=client)),
+        _seat_rows(
+            seats.filter(dates("reservation__"), reservation__contact_client=client).exclude(passenger_client=client),
+            day="reservation__trip_date",
+        ),
+        _reservation_rows(reservations.filter(dates(), contact_client=client, assignments__isnull=True)),
+    ]
+    cursor = params.get("cursor")
+    if cursor:
+        after = _after(decode_cursor(cursor))
+        branches = [branch.filter(after) for branch in branches]
+    branches = [branch.order_by(*ORDERING)[: limit + 1] for branch in branches]
+    rows = list(branches[0].union(*branches[1:], all=True).order_by(*ORDERING)[: limit + 1])
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [
+        {
+            "id": str(row["trip_ref"]),
+            "date": row["trip_day"],
+            "destination": row["destination"],
+            "reservation_id": str(row["reservation_ref"]),
+            "seat_no": row["seat"],
+            "status": row["reservation_status"],
+        }
+        for row in rows[:limit]
+    ], next_cursor
@@ -0,0 +1,183 @@
+"""Deduplicating CSV import of clients.
+
+Rows are matched to existing clients by passport id, normalized phone or
+email (in that order of precedence). Each chunk is written with a single
+``INSERT ... ON CONFLICT (id) DO UPDATE``: matched rows reuse the existing
+client's id and are merged field by field (blank CSV cells keep the stored
+value), unmatched rows get a fresh id. Phones are bulk-inserted with
+``ON CONFLICT DO NOTHING``. Model signals do not fire; one aggregated
+``client.imported`` event is published per chunk. The whole import is one
+transaction and the events go out on commit, so a decode error late in the
+file leaves neither rows nor events behind.
+"""
+import codecs
+import csv
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from .models import Client, Phone
+from .phones import normalize_phone
+from .signals import push
+
+CHUNK_SIZE = 500
+FIELDS = ("first_name", "last_name", "passport_id", "email", "nationality")
+UPDATE_FIELDS = [*FIELDS, "updated_at"]
+
+
+def clean_row(row):
+    data = {f: (row.get(f) or "").strip() for f in FIELDS}
+    data["email"] = data["email"].lower()
+    data["phone"] = normalize_phone(row.get("phone"))
+    errors = {}
+    if not (data["first_name"] or data["last_name"]):
+        errors["name"] = "first_name or last_name required"
+    if data["email"]:
+        try:
+            validate_email(data["email"])
+        except ValidationError:
+            errors["email"] = "invalid email"
+    for field, limit in (("first_name", 100), ("last_name", 100), ("passport_id", 64), ("nationality", 80)):
+        if len(data[field]) > limit:
+            errors[field] = f"longer than {limit} characters"
+    return data, errors
+
+
+def candidates(passports, emails, client_ids):
+    """Clients with one of ``passports``, lower-cased ``emails`` or ``client_ids``.
+
+    Each branch of the OR is served by its own index (passport, LOWER(email),
+    primary key), so a chunk costs a bitmap scan rather than a table scan.
+    """
+    return Client.objects.annotate(email_lower=Lower("email")).filter(
+        Q(passport_id__in=passports) | Q(email_lower__in=emails) | Q(id__in=client_ids)
+    ).order_by()
+
+
+class ClientMatcher:
+    """Finds existing clients for a chunk of rows with two queries."""
+
+    def __init__(self, rows):
+        passports = {r["passport_id"] for r in rows if r["passport_id"]}
+        emails = {r["email"] for r in rows if r["email"]}
+        phones = {r["phone"] for r in rows if r["phone"]}
+        self.by_phone = dict(
+            Phone.objects.filter(e164__in=phones).values_list("e164", "client_id")
+        ) if phones else {}
+        self.by_passport, self.by_email, self.by_id = {}, {}, {}
+        if not (passports or emails or self.by_phone):
+            return
+        for client in candidates(passports, emails, set(self.by_phone.values())):
+            self.by_id[client.id] = client
+            if client.passport_id:
+                self.by_passport.setdefault(client.passport_id, client)
+            if client.email_lower:
+                self.by_email.setdefault(client.email_lower, client)
+
+    def match(self, row):
+        if row["passport_id"] and row["passport_id"] in self.by_passport:
+            return self.by_passport[row["passport_id"]]
+        if row["phone"] and row["phone"] in self.by_phone:
+            return self.by_id.get(self.by_phone[row["phone"]])
+        if row["email"]:
+            return self.by_email.get(row["email"])
+        return None
+
+    def remember(self, row, client):
+        """Let later rows of the same chunk match a client created by an earlier one."""
+        self.by_id[client.id] = client
+        if row["passport_id"]:
+            self.by_passport.setdefault(row["passport_id"], client)
+        if row["email"]:
+            self.by_email.setdefault(row["email"], client)
+        if row["phone"]:
+            self.by_phone.setdefault(row["phone"], client.id)
+
+
+def merge(client, row):
+    for field in FIELDS:
+        if row[field]:
+            setattr(client, field, row[field])
+    if not client.passport_id:
+        client.passport_id = None
+
+
+def upsert_chunk(rows):
+    """Upsert one chunk of cleaned rows; returns ``(created, updated)``."""
+    matcher = ClientMatcher(rows)
+    existing_ids = set(matcher.by_id)
+    touched = {}
+    phones = []
+    for row in rows:
+        client = matcher.match(row)
+        if client is None:
+            client = Client(tags=[])
+            matcher.remember(row, client)
+        merge(client, row)
+        touched[client.id] = client
+        if row["phone"]:
+            phones.append(Phone(client_id=client.id, e164=row["phone"], is_primary=client.id not in existing_ids))
+    with transaction.atomic():
+        Client.objects.bulk_create(
+            list(touched.values()),
+            update_conflicts=True,
+            unique_fields=["id"],
+            update_fields=UPDATE_FIELDS,
+        )
+        _bulk_create_phones(phones)
+    updated = len(existing_ids & set(touched))
+    return len(touched) - updated, updated
+
+
+def _bulk_create_phones(phones):
+    # Drop in-chunk duplicates and give a client at most one primary phone per chunk
+    seen, primaries, unique = set(), set(), []
+    for phone in phones:
+        if (phone.client_id, phone.e164) in seen:
+            continue
+        seen.add((phone.client_id, phone.e164))
+        if phone.is_primary:
+            phone.is_primary = phone.client_id not in primaries
+            primaries.add(phone.client_id)
+        unique.append(phone)
+    Phone.objects.bulk_create(unique, ignore_conflicts=True)
+
+
+def import_clients(upload, chunk_size=None):
+    """Import clients from a CSV upload.
+
+    Returns ``(created, updated, errors)``; ``errors`` lists
+    ``{"row": <line number>, "errors": {field: message}}`` for rejected rows.
+    Raises ``UnicodeDecodeError`` if the file is not UTF-8, in which case
+    nothing is imported.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    reader = csv.DictReader(codecs.iterdecode(upload, "utf-8-sig"))
+    created = updated = 0
+    errors = []
+    chunk = []
+
+    def flush():
+        nonlocal created, updated
+        c, u = upsert_chunk(chunk)
+        created += c
+        updated += u
+        payload = {"type": "client.imported", "count": c + u, "created": c, "updated": u}
+        transaction.on_commit(lambda: push(payload))
+        chunk.clear()
+
+    with transaction.atomic():
+        for row in reader:
+            data, row_errors = clean_row(row)
+            if row_errors:
+                errors.append({"row": reader.line_num, "errors": row_errors})
+                continue
+            chunk.append(data)
+            if len(chunk) == chunk_size:
+                flush()
+        if chunk:
+            flush()
+    return created, updated, errors
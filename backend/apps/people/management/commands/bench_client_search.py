@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.people import search
+from apps.people.models import Client
+
+FIRST_NAMES = ["Ana", "Petar", "Marija", "Ivan", "Elena", "Stefan", "Jovana", "Nikola", "Sara", "Marko"]
+
+INSERT = """
+    INSERT INTO people_client
+        (id, first_name, last_name, nationality, email, notes, tags, is_active, created_at, updated_at)
+    SELECT gen_random_uuid(), (%s::text[])[1 + i %% %s], initcap(left(md5(i::text), 8)) || 'ov', '',
+           'c' || i || '@bench.mk', '', '{}', true, now(), now()
+    FROM generate_series(%s, %s) AS i
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Time client autocomplete and ?search= ranking at growing client counts and report whether "
+        "Postgres uses the trigram indexes. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100000,500000", help="Comma-separated client counts.")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, sizes, repeat, **options):
+        # A common first name (one row in ten matches), a rarer trigram and two terms
+        terms = ("ana", "petr", "ana 3ab")
+        with transaction.atomic():
+            inserted = 0
+            for size in sorted(int(s) for s in sizes.split(",")):
+                with connection.cursor() as cursor:
+                    cursor.execute(INSERT, [FIRST_NAMES, len(FIRST_NAMES), inserted + 1, size])
+                    cursor.execute("ANALYZE people_client")
+                inserted = size
+                for term in terms:
+                    queryset = search.search(Client.objects.filter(is_active=True), term.split())
+                    page = queryset.values(*search.RESULT_FIELDS)[: search.AUTOCOMPLETE_LIMIT]
+                    plan = page.explain()
+                    matched = queryset.count()
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        search.autocomplete(term)
+                        best = min(best, time.perf_counter() - start)
+                    self.stdout.write(
+                        f"{size:>9} clients  {term!r:<10} {matched:>7} ranked  "
+                        f"{best * 1000:>8.1f} ms  trigram index: {'trgm' in plan}"
+                    )
+            transaction.set_rollback(True)
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from apps.people import tags as client_tags
+from apps.people.models import Client
+
+INSERT = """
+    INSERT INTO people_client
+        (id, first_name, last_name, nationality, email, notes, tags, is_active, created_at, updated_at)
+    SELECT gen_random_uuid(), 'Bench', 'bench-' || i, '', '', '',
+           ARRAY['t' || (i %% 97), 'u' || (i %% 13), 'v' || (i %% 3)], true, now(), now()
+    FROM generate_series(%s, %s) AS i
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Time ?tags= filtering with all/any semantics at growing client counts and report "
+        "whether Postgres uses the GIN index on tags. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="100000,1000000", help="Comma-separated client counts.")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, sizes, repeat, **options):
+        cases = (("all", ["t5", "u5"]), ("any", ["t5", "t6"]), ("all", ["t5", "u5", "v2"]))
+        with transaction.atomic():
+            inserted = 0
+            for size in sorted(int(s) for s in sizes.split(",")):
+                with connection.cursor() as cursor:
+                    cursor.execute(INSERT, [inserted + 1, size])
+                    cursor.execute("ANALYZE people_client")
+                inserted = size
+                for mode, tags in cases:
+                    queryset = client_tags.filter_tags(Client.objects.all(), tags, mode).values("id")
+                    plan = queryset.explain()
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        count = len(queryset)
+                        best = min(best, time.perf_counter() - start)
+                    self.stdout.write(
+                        f"{size:>9} clients  {mode:>3} {','.join(tags):<10} {count:>7} rows  "
+                        f"{best * 1000:>8.1f} ms  gin index: {'people_client_tags_gin' in plan}"
+                    )
+            transaction.set_rollback(True)
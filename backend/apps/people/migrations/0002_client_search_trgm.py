@@ -0,0 +1,39 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+from django.db.models.functions import Upper
+
+
+def trigram_index(field, name):
+    return GinIndex(OpClass(Upper(field), name="gin_trgm_ops"), name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("people", "0001_initial"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="client",
+            index=trigram_index("first_name", "people_client_first_trgm"),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=trigram_index("last_name", "people_client_last_trgm"),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=trigram_index("passport_id", "people_client_passport_trgm"),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=trigram_index("email", "people_client_email_trgm"),
+        ),
+        migrations.AddIndex(
+            model_name="phone",
+            index=trigram_index("e164", "people_phone_e164_trgm"),
+        ),
+    ]
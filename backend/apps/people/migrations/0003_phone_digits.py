@@ -0,0 +1,63 @@
+import phonenumbers
+from django.db import migrations, models
+
+# Frozen copy of apps.people.phones.normalize_phone, with the region the
+# numbers stored so far were entered for.
+DEFAULT_REGION = "MK"
+
+
+def normalize_phone(raw):
+    raw = (raw or "").strip()
+    digits = "".join(c for c in raw if c.isdigit())
+    if not digits:
+        return ""
+    try:
+        num = phonenumbers.parse(raw, DEFAULT_REGION)
+    except phonenumbers.NumberParseException:
+        return f"+{digits}" if raw.startswith("+") else digits
+    return phonenumbers.format_number(num, phonenumbers.PhoneNumberFormat.E164)
+
+
+def normalize_phones(apps, schema_editor):
+    Phone = apps.get_model("people", "Phone")
+    seen = set()
+    duplicates, changed = [], []
+    # Primary phones first, so a number that collapses onto another keeps its primary flag
+    for phone in Phone.objects.order_by("client_id", "-is_primary", "pk").iterator(chunk_size=2000):
+        e164 = normalize_phone(phone.e164) or phone.e164
+        if (phone.client_id, e164) in seen:
+            duplicates.append(phone.pk)
+            continue
+        seen.add((phone.client_id, e164))
+        if e164 != phone.e164:
+            phone.e164 = e164
+            changed.append(phone)
+    Phone.objects.filter(pk__in=duplicates).delete()
+    Phone.objects.bulk_update(changed, ["e164"], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("people", "0002_client_search_trgm"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_phones, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="phone",
+            name="digits",
+            field=models.GeneratedField(
+                db_index=True,
+                db_persist=True,
+                expression=models.Func(
+                    "e164",
+                    models.Value("[^0-9]"),
+                    models.Value(""),
+                    models.Value("g"),
+                    function="regexp_replace",
+                ),
+                output_field=models.CharField(max_length=40),
+            ),
+        ),
+    ]
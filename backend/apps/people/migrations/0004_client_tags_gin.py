@@ -0,0 +1,16 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("people", "0003_phone_digits"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="client",
+            index=GinIndex(fields=["tags"], name="people_client_tags_gin"),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("people", "0004_client_tags_gin"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(fields=["passport_id"], name="people_client_passport_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="client",
+            index=models.Index(Lower("email"), name="people_client_email_lower_idx"),
+        ),
+    ]
@@ -1,6 +1,15 @@
 import uuid
 from django.db import models
+from django.db.models.functions import Lower, Upper
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+
+from .phones import normalize_phone
+
+
+def trigram_index(field, name):
+    """GIN trigram index on ``UPPER(field)``, the form ``icontains`` queries use."""
+    return GinIndex(OpClass(Upper(field), name="gin_trgm_ops"), name=name)
 
 
 class Client(models.Model):
@@ -18,9 +27,20 @@ class Client(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        indexes = [models.Index(fields=["last_name", "first_name"])]
+        indexes = [
+            models.Index(fields=["last_name", "first_name"]),
+            # Import deduplication (apps.people.imports)
+            models.Index(fields=["passport_id"], name="people_client_passport_idx"),
+            models.Index(Lower("email"), name="people_client_email_lower_idx"),
+            # Client search (apps.people.search)
+            trigram_index("first_name", "people_client_first_trgm"),
+            trigram_index("last_name", "people_client_last_trgm"),
+            trigram_index("passport_id", "people_client_passport_trgm"),
+            trigram_index("email", "people_client_email_trgm"),
+            # Tag containment/overlap filters (apps.people.tags)
+            GinIndex(fields=["tags"], name="people_client_tags_gin"),
+        ]
         ordering = ["last_name", "first_name"]
-        # indexes = [models.Index(fields=["e164"])]
 
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
@@ -30,13 +50,26 @@ class Phone(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="phones")
     e164 = models.CharField(max_length=40)
+    # Digits of e164, maintained by Postgres; the caller-ID lookup key
+    digits = models.GeneratedField(
+        expression=models.Func(
+            "e164", models.Value("[^0-9]"), models.Value(""), models.Value("g"), function="regexp_replace"
+        ),
+        output_field=models.CharField(max_length=40),
+        db_persist=True,
+        db_index=True,
+    )
     label = models.CharField(max_length=30, blank=True)
     is_primary = models.BooleanField(default=False)
 
     class Meta:
-        indexes = [models.Index(fields=["e164"])]
+        indexes = [models.Index(fields=["e164"]), trigram_index("e164", "people_phone_e164_trgm")]
         unique_together = ("client", "e164")
 
+    def save(self, *args, **kwargs):
+        self.e164 = normalize_phone(self.e164)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.label or 'Phone'}: {self.e164}"
 
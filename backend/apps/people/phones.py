@@ -0,0 +1,36 @@
+"""Phone number normalization shared by serializers, imports and lookups.
+
+Every stored ``Phone.e164`` goes through ``normalize_phone``. Numbers
+without a country code are read as ``settings.PHONE_DEFAULT_REGION``;
+input ``phonenumbers`` cannot parse is reduced to its digits (keeping a
+leading ``+``), so one number has one spelling. ``Phone.digits`` is the
+digits-only form, indexed for caller-ID lookups. Parses are cached per
+(number, region), since imports see the same numbers over and over.
+"""
+from functools import lru_cache
+
+import phonenumbers
+from django.conf import settings
+
+PARSE_CACHE_SIZE = 8192
+
+
+def normalize_phone(raw):
+    """Canonical form of ``raw``: E.164 when it parses, else its digits; ``""`` if it has none."""
+    return _normalize((raw or "").strip(), settings.PHONE_DEFAULT_REGION)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _normalize(raw, region):
+    digits = phone_digits(raw)
+    if not digits:
+        return ""
+    try:
+        num = phonenumbers.parse(raw, region)
+    except phonenumbers.NumberParseException:
+        return f"+{digits}" if raw.startswith("+") else digits
+    return phonenumbers.format_number(num, phonenumbers.PhoneNumberFormat.E164)
+
+
+def phone_digits(value):
+    return "".join(c for c in value if c.isdigit())
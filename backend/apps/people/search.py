@@ -0,0 +1,78 @@
+"""Client search backed by pg_trgm GIN indexes.
+
+Each search term must appear (case-insensitively) in a name, the passport,
+the email or one of the client's phones. Django compiles ``icontains`` to
+``UPPER(col) LIKE UPPER('%term%')``, which the ``UPPER(col) gin_trgm_ops``
+indexes on ``Client`` and ``Phone`` serve directly; phones are matched in a
+subquery rather than a join, so no ``DISTINCT`` is needed. Matches are ranked
+by trigram word similarity, summed over the terms; every match is ranked
+before the page is cut, which ``bench_client_search`` times at scale.
+"""
+from functools import reduce
+from operator import add
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from rest_framework import filters
+
+from .models import Client, Phone
+from .phones import phone_digits
+
+FIELDS = ("first_name", "last_name", "passport_id", "email")
+RANK = "search_rank"
+# pg_trgm extracts no trigram from a shorter pattern, so the GIN indexes could
+# not narrow the scan
+AUTOCOMPLETE_MIN_LENGTH = 3
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+RESULT_FIELDS = ("id", "first_name", "last_name", "passport_id", "email")
+
+
+def matches(term):
+    # A UNION keeps each branch a plain (bitmap) index scan; OR-ing the phone
+    # subquery into the client predicate would force a sequential scan.
+    q = Q()
+    for field in FIELDS:
+        q |= Q(**{f"{field}__icontains": term})
+    by_client = Client.objects.filter(q).order_by().values("pk")
+    by_phone = Phone.objects.filter(e164__icontains=term).values("client_id")
+    return Q(pk__in=by_client.union(by_phone))
+
+
+def similarity(term):
+    # passport_id is nullable; GREATEST skips NULLs
+    return Greatest(*(TrigramWordSimilarity(term, field) for field in FIELDS))
+
+
+def search(queryset, terms):
+    """``queryset`` filtered to clients matching every term, best match first."""
+    for term in terms:
+        queryset = queryset.filter(matches(term))
+    ordering = queryset.query.order_by or Client._meta.ordering
+    return queryset.annotate(**{RANK: reduce(add, map(similarity, terms))}).order_by(f"-{RANK}", *ordering, "pk")
+
+
+def autocomplete(term, limit=AUTOCOMPLETE_LIMIT):
+    """Best active matches for ``term``; words shorter than ``AUTOCOMPLETE_MIN_LENGTH`` are ignored."""
+    terms = [t for t in term.split() if len(t) >= AUTOCOMPLETE_MIN_LENGTH]
+    if not terms:
+        return []
+    queryset = search(Client.objects.filter(is_active=True), terms)
+    return list(queryset.values(*RESULT_FIELDS)[:limit])
+
+
+def by_phone(phone):
+    """Clients owning ``phone`` (already normalized), in one query on ``Phone.digits``."""
+    owners = Phone.objects.filter(digits=phone_digits(phone)).values("client_id")
+    return list(Client.objects.filter(pk__in=owners).values(*RESULT_FIELDS, "is_active"))
+
+
+class ClientSearchFilter(filters.SearchFilter):
+    """``?search=`` through ``search`` instead of DRF's joined ``icontains`` scan."""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search(queryset, terms)
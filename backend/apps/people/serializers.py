@@ -1,18 +1,18 @@
 from rest_framework import serializers
 from .models import Client, Phone, ClientNote
 from django.conf import settings
-from django.urls import reverse
-import phonenumbers
+from apps.links import LinksMixin, builder as link_builder
+from .phones import normalize_phone
 
 
 class RelaxedPhoneField(serializers.CharField):
+    default_error_messages = {"no_digits": "Enter a phone number."}
+
     def to_internal_value(self, data):
-        data = super().to_internal_value(data)
-        try:
-            num = phonenumbers.parse(data, None)
-            return phonenumbers.format_number(num, phonenumbers.PhoneNumberFormat.E164)
-        except Exception:
-            return data
+        phone = normalize_phone(super().to_internal_value(data))
+        if not phone:
+            self.fail("no_digits")
+        return phone
 
 class PhoneSerializer(serializers.ModelSerializer):
     e164 = RelaxedPhoneField()
@@ -21,7 +21,7 @@ class PhoneSerializer(serializers.ModelSerializer):
         model = Phone
         fields = ("id", "e164", "label", "is_primary")
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(LinksMixin, serializers.ModelSerializer):
     phones = PhoneSerializer(many=True, required=False)
     links = serializers.SerializerMethodField()
 
@@ -53,18 +53,15 @@ class ClientSerializer(serializers.ModelSerializer):
         return instance
     
     def get_links(self, obj):
-        req = self.context.get("request")
+        link = link_builder(self.context.get("request"))
         ui = settings.FRONTEND_BASE_URL
 
-        def abs_url(name, *args, **kwargs):
-            return req.build_absolute_uri(reverse(name, args=args, kwargs=kwargs)) if req else ""
-
-        base_res = abs_url("reservation-list")
+        base_res = link("reservation-list")
         res_url = f"{base_res}?contact_client={obj.id}" if base_res else ""
         return {
-            "api.self": abs_url("client-detail", obj.id),
+            "api.self": link("client-detail", obj.id),
             "api.reservations": res_url,
-            "api.history": abs_url("client-history", obj.id),
+            "api.history": link("client-history", obj.id),
             "ui.self": f"{ui}/clients/{obj.id}",
         }
 
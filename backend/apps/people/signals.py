@@ -2,6 +2,7 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from apps.dashboard import cache as dashboard_cache
 from .models import Client
 
 channel_layer = get_channel_layer()
@@ -11,6 +12,7 @@ def push(payload):
 
 
 def push_dashboard(payload):
+    dashboard_cache.invalidate()
     async_to_sync(channel_layer.group_send)("dashboard", {"type": "broadcast", "data": payload})
 
 @receiver(post_save, sender=Client)
@@ -0,0 +1,76 @@
+"""Client tag filtering and bulk tagging.
+
+``?tags=a,b`` is compiled into one array predicate on ``Client.tags``:
+containment (``@>``, every tag) by default, or overlap (``&&``, any tag)
+with ``?tags_mode=any``. Both operators are served by the GIN index on
+``tags``.
+
+``bulk_update_tags`` adds and removes tags across a queryset with one
+``UPDATE`` built from ``array_remove``/``array_append``, touching only the
+rows whose tags actually change.
+"""
+from django.db import transaction
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Cast, Now
+from rest_framework.exceptions import ValidationError
+
+from .models import ActivityEvent, Client
+
+MODES = {"all": "tags__contains", "any": "tags__overlap"}
+TAG_MAX_LENGTH = Client._meta.get_field("tags").base_field.max_length
+
+
+def parse_tags(value):
+    return list(dict.fromkeys(t.strip() for t in (value or "").split(",") if t.strip()))
+
+
+def filter_tags(queryset, tags, mode="all"):
+    if mode not in MODES:
+        raise ValidationError({"tags_mode": f"must be one of: {', '.join(MODES)}"})
+    if not tags:
+        return queryset
+    return queryset.filter(**{MODES[mode]: tags})
+
+
+def clean_tag_list(value, name):
+    if not isinstance(value, list) or not all(isinstance(t, str) for t in value):
+        raise ValidationError({name: "must be a list of strings"})
+    tags = list(dict.fromkeys(t.strip() for t in value if t.strip()))
+    if any(len(t) > TAG_MAX_LENGTH for t in tags):
+        raise ValidationError({name: f"tags are at most {TAG_MAX_LENGTH} characters"})
+    return tags
+
+
+def updated_tags(add, remove):
+    """Expression for ``tags`` without ``remove`` and ending with ``add``.
+
+    Every tag of either list is removed first, so added tags are never
+    duplicated (one the client already had moves to the end).
+    """
+    field = Client._meta.get_field("tags")
+    tags = F("tags")
+    for tag in [*remove, *add]:
+        tags = Func(tags, Cast(Value(tag), field.base_field), function="array_remove", output_field=field)
+    if add:
+        tags = Func(tags, Value(add, output_field=field), function="array_cat", output_field=field)
+    return tags
+
+
+def bulk_update_tags(queryset, add, remove):
+    """Apply ``add``/``remove`` to the clients of ``queryset``; returns ``{client_id: tags}`` of those changed."""
+    changed = Q()
+    if add:
+        changed |= ~Q(tags__contains=add)
+    if remove:
+        changed |= Q(tags__overlap=remove)
+    with transaction.atomic():
+        ids = list(queryset.filter(changed).order_by().select_for_update().values_list("pk", flat=True))
+        if not ids:
+            return {}
+        Client.objects.filter(pk__in=ids).update(tags=updated_tags(add, remove), updated_at=Now())
+        result = dict(Client.objects.filter(pk__in=ids).values_list("pk", "tags"))
+        ActivityEvent.objects.bulk_create(
+            ActivityEvent(event_type="client.tagged", client_id=pk, data={"tags": tags})
+            for pk, tags in result.items()
+        )
+    return result
@@ -1,20 +1,53 @@
+import json
+from django.db import connection
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from datetime import date
+from datetime import date, timedelta
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
 from apps.fleet.models import BusType, Bus
 from apps.trips.models import Trip, Reservation, SeatAssignment
-from .models import Client
+from unittest.mock import patch
+from apps.projection import Projection
+from .imports import candidates
+from .phones import normalize_phone
+from .models import ActivityEvent, Client, Phone
+from .serializers import ClientSerializer
 
 class TestClientPhone(APITestCase):
     def test_relaxed_phone(self):
         url = reverse("client-list")
-        data = {"first_name": "Foo", "last_name": "Bar", "phones": [{"e164": "notaphone"}]}
+        data = {"first_name": "Foo", "last_name": "Bar", "phones": [{"e164": "070 123-456"}, {"e164": "+1 (2)"}]}
         resp = self.client.post(url, data, format="json")
         self.assertEqual(resp.status_code, 201)
         client = Client.objects.get(first_name="Foo")
-        self.assertEqual(client.phones.first().e164, "notaphone")
+        self.assertEqual(
+            sorted(client.phones.values_list("e164", "digits")), [("+12", "12"), ("+38970123456", "38970123456")]
+        )
+        data["phones"] = [{"e164": "notaphone"}]
+        self.assertEqual(self.client.post(url, data, format="json").status_code, 400)
+
+    def test_lookup_by_number(self):
+        self.client.force_authenticate(get_user_model().objects.create_user("cid", password="p"))
+        owner = Client.objects.create(first_name="Caller", last_name="Id")
+        Phone.objects.create(client=owner, e164="+389 70 123 456")
+        Client.objects.create(first_name="Other", last_name="Id")
+        url = reverse("client-lookup")
+        with self.assertNumQueries(1):
+            resp = self.client.get(url, {"phone": "070/123-456"})
+        self.assertEqual(resp.data["phone"], "+38970123456")
+        self.assertEqual([c["id"] for c in resp.data["results"]], [owner.id])
+        self.assertEqual(self.client.get(url, {"phone": "0038970123456"}).data["results"][0]["id"], owner.id)
+        self.assertEqual(self.client.get(url, {"phone": "x"}).status_code, 400)
+
+    def test_normalize_follows_default_region(self):
+        self.assertEqual(normalize_phone("070 123 456"), "+38970123456")
+        with override_settings(PHONE_DEFAULT_REGION="DE"):
+            self.assertEqual(normalize_phone("070 123 456"), "+4970123456")
 
 
 class TestClientHistory(APITestCase):
@@ -52,6 +85,50 @@ class TestClientHistory(APITestCase):
         self.assertEqual(entry["seat_no"], 1)
         self.assertEqual(entry["status"], "CONFIRMED")
 
+    def test_history_pages_and_filters(self):
+        other = Client.objects.create(first_name="Other", last_name="Passenger")
+        for days in (1, 2, 3):
+            trip = Trip.objects.create(trip_date=date.today() + timedelta(days=days), origin="A", destination=f"D{days}")
+            res = Reservation.objects.create(
+                trip=trip, contact_client=self.client_rec, quantity=1, status="HOLD" if days == 3 else "CONFIRMED",
+                created_by=self.user, updated_by=self.user,
+            )
+            if days == 1:
+                SeatAssignment.objects.create(trip=trip, seat_no=4, reservation=res, passenger_client=other)
+        url = reverse("client-history", args=[self.client_rec.id])
+        with self.assertNumQueries(2):  # client, then one UNION ALL for the page
+            resp = self.client.get(url, {"limit": 2})
+        self.assertEqual([(t["destination"], t["seat_no"]) for t in resp.data["trips"]], [("B", 1), ("D1", 4)])
+        resp = self.client.get(resp.data["next"])
+        self.assertEqual([(t["destination"], t["seat_no"]) for t in resp.data["trips"]], [("D2", None), ("D3", None)])
+        self.assertIsNone(resp.data["next"])
+
+    def test_history_follows_trip_date_changes(self):
+        later = Trip.objects.create(trip_date=date.today() + timedelta(days=1), origin="A", destination="Later")
+        Reservation.objects.create(
+            trip=later, contact_client=self.client_rec, quantity=1, created_by=self.user, updated_by=self.user
+        )
+        self.trip.trip_date = date.today() + timedelta(days=5)
+        self.trip.save()
+        self.assertEqual(set(SeatAssignment.objects.values_list("trip_date", flat=True)), {self.trip.trip_date})
+        resp = self.client.get(reverse("client-history", args=[self.client_rec.id]))
+        self.assertEqual([t["destination"] for t in resp.data["trips"]], ["Later", "B"])
+
+    def test_history_branches_walk_the_client_date_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        seats = SeatAssignment.objects.filter(passenger_client=self.client_rec)
+        plan = seats.order_by("trip_date", "reservation", "seat_no")[:3].explain()
+        self.assertIn("trips_seat_client_date_idx", plan)
+        plan = Reservation.objects.filter(contact_client=self.client_rec).order_by("trip_date", "id")[:3].explain()
+        self.assertIn("trips_res_contact_date_idx", plan)
+
+        resp = self.client.get(url, {"status": "hold"})
+        self.assertEqual([t["destination"] for t in resp.data["trips"]], ["D3"])
+        resp = self.client.get(url, {"date_from": (date.today() + timedelta(days=2)).isoformat()})
+        self.assertEqual([t["destination"] for t in resp.data["trips"]], ["D2", "D3"])
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 404)
+
 
 class TestClientCRM(APITestCase):
     def setUp(self):
@@ -84,6 +161,19 @@ class TestClientCRM(APITestCase):
         self.assertIn("client.tagged", types)
         self.assertIn("client.note.added", types)
 
+    def test_tag_filter_modes(self):
+        Client.objects.create(first_name="Both", last_name="T", tags=["vip", "ski"])
+        Client.objects.create(first_name="Ski", last_name="T", tags=["ski"])
+        Client.objects.create(first_name="None", last_name="T")
+        url = reverse("client-list")
+
+        def names(params):
+            return sorted(c["first_name"] for c in self.client.get(url, params).data["results"])
+
+        self.assertEqual(names({"tags": "vip, ski"}), ["Both"])
+        self.assertEqual(names({"tags": "vip,ski", "tags_mode": "any"}), ["Both", "Ski"])
+        self.assertEqual(self.client.get(url, {"tags": "vip", "tags_mode": "some"}).status_code, 400)
+
 
 class TestClientCRUD(APITestCase):
     def setUp(self):
@@ -127,10 +217,200 @@ class TestClientImportExportBulk(APITestCase):
         self.assertEqual(Client.objects.count(), 2)
 
         export = self.client.get(reverse("client-export") + "?format=csv")
-        self.assertIn("A,B", export.content.decode())
+        self.assertTrue(export.streaming)
+        self.assertIn("A,B", b"".join(export.streaming_content).decode())
 
         ids = list(Client.objects.values_list("id", flat=True))
         bulk_url = reverse("client-bulk")
         resp = self.client.post(bulk_url, {"ids": ids, "action": "inactive"}, format="json")
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(Client.objects.filter(is_active=False).count(), 2)
+
+
+class TestClientDedupImport(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("dedup", password="p")
+        self.client.force_authenticate(self.user)
+        self.by_passport = Client.objects.create(first_name="Old", last_name="Name", passport_id="P1", email="keep@x.com")
+        self.by_phone = Client.objects.create(first_name="Phone", last_name="Owner")
+        Phone.objects.create(client=self.by_phone, e164="+38970123456", is_primary=True)
+
+    def test_reimport_upserts_instead_of_duplicating(self):
+        csv_data = (
+            "first_name,last_name,passport_id,email,phone\n"
+            "New,Name,P1,,\n"
+            "Ana,Nova,,ana@x.com,+1 202 555 0101\n"
+            "Ana,Nova,,ANA@x.com,\n"
+            ",Caller,,,+389 70 123 456\n"
+            ",,,,\n"
+        ).encode()
+        with patch("apps.people.imports.push") as mock_push, self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                reverse("client-import"),
+                {"file": SimpleUploadedFile("clients.csv", csv_data, content_type="text/csv")},
+                format="multipart",
+            )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.data["created"], resp.data["updated"]), (1, 2))
+        self.assertEqual([e["row"] for e in resp.data["errors"]], [6])
+        self.assertEqual(Client.objects.count(), 3)
+        self.by_passport.refresh_from_db()
+        self.assertEqual((self.by_passport.first_name, self.by_passport.email), ("New", "keep@x.com"))
+        self.by_phone.refresh_from_db()
+        self.assertEqual(self.by_phone.last_name, "Caller")
+        ana = Client.objects.get(email="ana@x.com")
+        self.assertEqual(list(ana.phones.values_list("e164", "is_primary")), [("+12025550101", True)])
+        mock_push.assert_called_once_with({"type": "client.imported", "count": 3, "created": 1, "updated": 2})
+
+        # importing the same file again creates nothing new
+        resp = self.client.post(
+            reverse("client-import"),
+            {"file": SimpleUploadedFile("clients.csv", csv_data, content_type="text/csv")},
+            format="multipart",
+        )
+        self.assertEqual((resp.data["created"], resp.data["updated"]), (0, 3))
+        self.assertEqual(Client.objects.count(), 3)
+
+    def test_decode_error_after_first_chunk_imports_nothing(self):
+        csv_data = b"first_name,last_name\nA,One\nB,Two\nC,\xff\n"
+        with patch("apps.people.imports.push") as mock_push, patch("apps.people.imports.CHUNK_SIZE", 1):
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    reverse("client-import"),
+                    {"file": SimpleUploadedFile("clients.csv", csv_data, content_type="text/csv")},
+                    format="multipart",
+                )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(Client.objects.count(), 2)  # the two from setUp
+        self.assertFalse(mock_push.called)
+
+    def test_match_lookup_uses_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        plan = candidates({"P1"}, {"keep@x.com"}, set()).explain()
+        self.assertIn("people_client_passport_idx", plan)
+        self.assertIn("people_client_email_lower_idx", plan)
+
+
+class TestClientProjection(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("pc", password="p")
+        self.client.force_authenticate(self.user)
+        a = Client.objects.create(
+            first_name="Ana", last_name="A", birth_date=date(1990, 1, 2), email="a@x.mk", tags=["vip", "x"],
+        )
+        Phone.objects.create(client=a, e164="+38970111222", label="mob", is_primary=True)
+        Phone.objects.create(client=a, e164="+38970111333")
+        Client.objects.create(first_name="Bo", last_name="B")
+
+    def test_projection_matches_serializer(self):
+        for path in ("/", "/?links=0"):
+            request = Request(APIRequestFactory().get(path, HTTP_HOST="localhost"))
+            context = {"request": request}
+            queryset = Client.objects.prefetch_related("phones")
+            projection = Projection.for_serializer(ClientSerializer, context)
+            with self.assertNumQueries(2):  # clients, then phones for all of them
+                rendered = JSONRenderer().render(projection.represent(projection.values(queryset)))
+            expected = JSONRenderer().render(ClientSerializer(queryset, many=True, context=context).data)
+            self.assertEqual(rendered, expected)
+
+    def test_list_and_json_export(self):
+        resp = self.client.get(reverse("client-list"))
+        self.assertEqual([c["first_name"] for c in resp.data["results"]], ["Ana", "Bo"])
+        self.assertEqual(len(resp.data["results"][0]["phones"]), 2)
+        export = self.client.get(reverse("client-export") + "?format=json")
+        rows = json.loads(b"".join(export.streaming_content))
+        self.assertEqual(rows[0]["tags"], ["vip", "x"])
+        self.assertEqual(rows[0]["birth_date"], "1990-01-02")
+
+
+class TestClientSearch(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("srch", password="p")
+        self.client.force_authenticate(self.user)
+        self.exact = Client.objects.create(first_name="Petar", last_name="Petrov")
+        self.partial = Client.objects.create(first_name="Ana", last_name="Petrovska", email="ana@x.mk")
+        other = Client.objects.create(first_name="Ivo", last_name="Ilic")
+        Phone.objects.create(client=other, e164="+38970555111")
+        Phone.objects.create(client=other, e164="+38970555222")
+        Client.objects.create(first_name="Petra", last_name="Old", is_active=False)
+
+    def test_search_ranks_and_matches_phones(self):
+        resp = self.client.get(reverse("client-list"), {"search": "petrov"})
+        self.assertEqual([c["id"] for c in resp.data["results"]], [str(self.exact.id), str(self.partial.id)])
+        resp = self.client.get(reverse("client-list"), {"search": "70555"})
+        # two matching phones, one client
+        self.assertEqual([c["last_name"] for c in resp.data["results"]], ["Ilic"])
+        resp = self.client.get(reverse("client-list"), {"search": "ana x.mk"})
+        self.assertEqual([c["last_name"] for c in resp.data["results"]], ["Petrovska"])
+
+    def test_autocomplete(self):
+        url = reverse("client-autocomplete")
+        resp = self.client.get(url, {"q": "petr", "limit": 1})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([c["id"] for c in resp.data["results"]], [self.exact.id])
+        resp = self.client.get(url, {"q": "petr"})
+        self.assertEqual(len(resp.data["results"]), 2)  # inactive clients are left out
+        self.assertEqual(self.client.get(url, {"q": "pe"}).data["results"], [])
+        self.assertEqual(len(self.client.get(url, {"q": "petrov a"}).data["results"]), 2)  # "a" is ignored
+        self.assertEqual(self.client.get(url, {"q": "petr", "limit": "x"}).status_code, 400)
+
+
+class TestBulkTags(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("bt", password="p")
+        self.client.force_authenticate(self.user)
+        self.a = Client.objects.create(first_name="A", last_name="Seg", nationality="MK", tags=["old", "vip"])
+        self.b = Client.objects.create(first_name="B", last_name="Seg", nationality="MK", tags=["news"])
+        self.c = Client.objects.create(first_name="C", last_name="Other", nationality="AL", tags=["old"])
+
+    def test_add_and_remove_for_filtered_clients(self):
+        url = reverse("client-bulk-tags") + "?nationality=MK"
+        with patch("apps.people.views.push") as mock_push, self.assertNumQueries(6):
+            # savepoint, locked ids, update, read back, activity events, release
+            resp = self.client.post(url, {"add": ["news", "summer"], "remove": ["old"]}, format="json")
+        self.assertEqual(resp.data["processed"], 2)
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.c.refresh_from_db()
+        self.assertEqual(self.a.tags, ["vip", "news", "summer"])
+        self.assertEqual(self.b.tags, ["news", "summer"])
+        self.assertEqual(self.c.tags, ["old"])
+        mock_push.assert_called_once()
+        pushed = mock_push.call_args.args[0]
+        self.assertEqual((pushed["type"], pushed["action"]), ("client.bulk", "tags"))
+        self.assertEqual(
+            pushed["tags"], {str(self.a.id): ["vip", "news", "summer"], str(self.b.id): ["news", "summer"]}
+        )
+        self.assertEqual(ActivityEvent.objects.filter(event_type="client.tagged").count(), 2)
+
+        # nothing left to change
+        resp = self.client.post(url, {"add": ["summer"], "ids": [str(self.a.id)]}, format="json")
+        self.assertEqual(resp.data["processed"], 0)
+        self.assertEqual(self.client.post(url, {"add": "x"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(url, {"add": ["x"], "remove": ["x"]}, format="json").status_code, 400)
+
+
+class TestClientFacets(APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("fc", password="p")
+        self.client.force_authenticate(self.user)
+        Client.objects.create(first_name="A", last_name="F", nationality="MK", birth_date=date(1985, 3, 1), tags=["vip", "ski"])
+        Client.objects.create(first_name="B", last_name="F", nationality="MK", birth_date=date(1989, 1, 1), tags=["ski"])
+        Client.objects.create(first_name="C", last_name="F", nationality="AL")
+        Client.objects.create(first_name="D", last_name="F", nationality="AL", is_active=False, tags=["vip"])
+
+    def test_counts_follow_filters_in_one_query(self):
+        url = reverse("client-facets")
+        with self.assertNumQueries(1):
+            data = self.client.get(url).data
+        self.assertEqual(data["total"], 3)
+        self.assertEqual(data["nationality"], [{"value": "MK", "count": 2}, {"value": "AL", "count": 1}])
+        self.assertEqual(data["is_active"], [{"value": True, "count": 3}])
+        self.assertEqual(data["birth_decade"], [{"value": 1980, "count": 2}, {"value": None, "count": 1}])
+        self.assertEqual(data["tags"], [{"value": "ski", "count": 2}, {"value": "vip", "count": 1}])
+
+        data = self.client.get(url, {"is_active": "false"}).data
+        self.assertEqual((data["total"], data["tags"]), (1, [{"value": "vip", "count": 1}]))
+        data = self.client.get(url, {"tags": "ski", "search": "a"}).data
+        self.assertEqual(data["total"], 1)
@@ -1,34 +1,33 @@
-from rest_framework import viewsets, filters
+from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework.utils.urls import replace_query_param
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
-import csv
-import json
 from .models import Client, ClientNote, ActivityEvent
 from .serializers import ClientSerializer, ClientNoteSerializer
-from .signals import push
+from .signals import push, push_dashboard
+from .imports import import_clients
+from . import facets as client_facets, history as client_history, search as client_search, tags as client_tags
+from .phones import normalize_phone
 from rest_framework.decorators import api_view
-from apps.trips.models import Reservation, SeatAssignment
+from apps.dashboard import cache as dashboard_cache
+from apps.projection import ProjectedListMixin
+from apps.streaming import (
+    CURSOR_CHUNK_SIZE, EXPORT_RENDERERS, JSON_CONTENT_TYPES, serialized_rows, streaming_csv, streaming_json,
+)
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Client.objects.all().prefetch_related("phones").order_by("last_name", "first_name")
     serializer_class = ClientSerializer
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, client_search.ClientSearchFilter]
     filterset_fields = ["birth_date", "nationality", "is_active", "created_at"]
-    search_fields = ["first_name", "last_name", "passport_id", "email", "phones__e164"]
 
     def get_queryset(self):
-        qs = super().get_queryset().distinct()
+        qs = super().get_queryset()
         if "is_active" not in self.request.query_params:
             qs = qs.filter(is_active=True)
-        tags_param = self.request.query_params.get("tags")
-        if tags_param:
-            tags = [t.strip() for t in tags_param.split(",") if t.strip()]
-            for t in tags:
-                qs = qs.filter(tags__contains=[t])
-        return qs
+        params = self.request.query_params
+        return client_tags.filter_tags(qs, client_tags.parse_tags(params.get("tags")), params.get("tags_mode", "all"))
 
     def destroy(self, request, *args, **kwargs):
         client = self.get_object()
@@ -36,43 +35,54 @@ class ClientViewSet(viewsets.ModelViewSet):
         client.save()
         return Response(status=204)
 
-    @action(detail=False, methods=["get"], url_path="export", url_name="export")
+    @action(detail=False, methods=["get"], url_path="autocomplete", url_name="autocomplete")
+    def autocomplete(self, request):
+        try:
+            limit = int(request.query_params.get("limit", client_search.AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=400)
+        limit = max(1, min(limit, client_search.AUTOCOMPLETE_MAX_LIMIT))
+        return Response({"results": client_search.autocomplete(request.query_params.get("q", ""), limit)})
+
+    @action(detail=False, methods=["get"], url_path="facets", url_name="facets")
+    def facets(self, request):
+        qs = self.filter_queryset(self.get_queryset())
+        return Response(client_facets.cached_counts(request, qs))
+
+    @action(detail=False, methods=["get"], url_path="lookup", url_name="lookup")
+    def lookup(self, request):
+        phone = normalize_phone(request.query_params.get("phone"))
+        if not phone:
+            return Response({"detail": "phone required"}, status=400)
+        return Response({"phone": phone, "results": client_search.by_phone(phone)})
+
+    @action(detail=False, methods=["get"], url_path="export", url_name="export", renderer_classes=EXPORT_RENDERERS)
     def export(self, request):
         fmt = request.query_params.get("format", "json")
         qs = self.get_queryset()
         if fmt == "csv":
-            resp = HttpResponse(content_type="text/csv")
-            resp["Content-Disposition"] = "attachment; filename=clients.csv"
-            writer = csv.writer(resp)
-            writer.writerow(["ID", "FirstName", "LastName", "Passport", "Email"])
-            for c in qs:
-                writer.writerow([c.id, c.first_name, c.last_name, c.passport_id, c.email])
-            return resp
-        data = ClientSerializer(qs, many=True, context={"request": request}).data
-        if fmt == "json":
-            resp = HttpResponse(json.dumps(data, default=str), content_type="application/json")
-            resp["Content-Disposition"] = "attachment; filename=clients.json"
-            return resp
-        return Response(data)
+            # Phones are not part of the CSV: drop the prefetch, which would defeat the cursor
+            rows = qs.prefetch_related(None).values_list(
+                "id", "first_name", "last_name", "passport_id", "email"
+            ).iterator(chunk_size=CURSOR_CHUNK_SIZE)
+            return streaming_csv(request, "clients.csv", ["ID", "FirstName", "LastName", "Passport", "Email"], rows)
+        if fmt in JSON_CONTENT_TYPES:
+            rows = serialized_rows(ClientSerializer, qs, {"request": request})
+            return streaming_json(request, "clients", fmt, rows)
+        return Response(ClientSerializer(qs, many=True, context={"request": request}).data)
 
     @action(detail=False, methods=["post"], url_path="import", url_name="import")
     def import_csv(self, request):
         file = request.FILES.get("file")
         if not file:
             return Response({"detail": "file required"}, status=400)
-        decoded = file.read().decode()
-        reader = csv.DictReader(decoded.splitlines())
-        created = 0
-        for row in reader:
-            Client.objects.create(
-                first_name=row.get("first_name", ""),
-                last_name=row.get("last_name", ""),
-                passport_id=row.get("passport_id", ""),
-            )
-            created += 1
-        if created:
-            push({"type": "client.imported", "count": created})
-        return Response({"created": created})
+        try:
+            created, updated, errors = import_clients(file)
+        except UnicodeDecodeError:
+            return Response({"detail": "file must be UTF-8 encoded CSV"}, status=400)
+        if created or updated:
+            push_dashboard({"type": "data.changed"})
+        return Response({"created": created, "updated": updated, "errors": errors})
 
     @action(detail=False, methods=["post"], url_path="bulk", url_name="bulk")
     def bulk(self, request):
@@ -89,6 +99,33 @@ class ClientViewSet(viewsets.ModelViewSet):
         push({"type": "client.bulk", "action": action, "ids": [str(i) for i in ids]})
         return Response({"processed": count})
 
+    @action(detail=False, methods=["post"], url_path="bulk-tags", url_name="bulk-tags")
+    def bulk_tags(self, request):
+        """Add/remove tags on every client matching the list filters (optionally limited to ``ids``)."""
+        add = client_tags.clean_tag_list(request.data.get("add", []), "add")
+        remove = client_tags.clean_tag_list(request.data.get("remove", []), "remove")
+        if not (add or remove):
+            return Response({"detail": "add or remove required"}, status=400)
+        if set(add) & set(remove):
+            return Response({"detail": "a tag cannot be both added and removed"}, status=400)
+        qs = self.filter_queryset(self.get_queryset())
+        if "ids" in request.data:
+            qs = qs.filter(id__in=request.data["ids"])
+        changed = client_tags.bulk_update_tags(qs, add, remove)
+        if changed:
+            # One event for the whole batch; the activity feed refetches the
+            # client.tagged rows bulk_update_tags recorded.
+            push({
+                "type": "client.bulk",
+                "action": "tags",
+                "add": add,
+                "remove": remove,
+                "ids": [str(pk) for pk in changed],
+                "tags": {str(pk): tags for pk, tags in changed.items()},
+            })
+            dashboard_cache.invalidate()
+        return Response({"processed": len(changed)})
+
     @action(detail=True, methods=["patch"], url_path="tags", url_name="tags")
     def set_tags(self, request, pk=None):
         client = self.get_object()
@@ -117,44 +154,20 @@ class ClientViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=["get"], url_path="history", url_name="history")
     def history(self, request, pk=None):
-        client = self.get_object()
-        assignments = (
-            SeatAssignment.objects.filter(
-                Q(passenger_client=client) | Q(reservation__contact_client=client)
-            )
-            .select_related("trip", "reservation")
-            .order_by("trip__trip_date")
-        )
-        trips = [
-            {
-                "id": str(a.trip.id),
-                "date": a.trip.trip_date,
-                "destination": a.trip.destination,
-                "reservation_id": str(a.reservation_id),
-                "seat_no": a.seat_no,
-                "status": a.reservation.status,
-            }
-            for a in assignments
-        ]
-        assigned_res = {a.reservation_id for a in assignments}
-        extras = (
-            Reservation.objects.filter(contact_client=client)
-            .exclude(id__in=assigned_res)
-            .select_related("trip")
-        )
-        for r in extras:
-            trips.append(
-                {
-                    "id": str(r.trip.id),
-                    "date": r.trip.trip_date,
-                    "destination": r.trip.destination,
-                    "reservation_id": str(r.id),
-                    "seat_no": None,
-                    "status": r.status,
-                }
-            )
-        return Response({"trips": trips})
+        """Trips of the client, oldest first, in keyset pages (``?cursor=``, ``?limit=``).
 
+        Filters: ``date_from``/``date_to`` (trip date) and ``status`` (reservation
+        status, comma-separated).
+        """
+        client = self.get_object()
+        try:
+            limit = int(request.query_params.get("limit", client_history.PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "limit must be an integer"}, status=400)
+        limit = max(1, min(limit, client_history.MAX_PAGE_SIZE))
+        trips, cursor = client_history.page(client, request.query_params, limit)
+        next_url = replace_query_param(request.build_absolute_uri(), "cursor", cursor) if cursor else None
+        return Response({"trips": trips, "next": next_url})
 
 @api_view(["GET"])
 def activity_feed(request):
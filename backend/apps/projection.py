@@ -0,0 +1,153 @@
+"""Read-only serialization from ``values()`` rows.
+
+``Projection`` mirrors a ``ModelSerializer``'s output without building model
+instances or running DRF's per-field attribute lookups: rows come from a
+``values()`` projection of exactly the serialized columns, and each field gets
+a converter picked once per projection (``str`` for UUIDs, ``isoformat`` for
+ISO dates, the field's own ``to_representation`` for anything less common).
+Method fields receive the row with attribute access, and nested
+``many=True`` serializers over a reverse foreign key are loaded with one
+query per batch of rows. Serializers using other field types are reported as
+unsupported and keep going through DRF.
+
+``ProjectedListMixin`` uses it for GET list endpoints; ``apps.streaming``
+uses it for exports.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import F, ManyToOneRel
+from rest_framework import ISO_8601, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+COLUMN, METHOD, NESTED = range(3)
+PARENT = "_projection_parent"
+
+
+class Unsupported(Exception):
+    pass
+
+
+class _Row(dict):
+    """A values() row that method fields can read like a model instance."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def _converter(field):
+    kind = type(field)
+    if isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+        return None  # DRF renders the raw pk
+    if isinstance(field, serializers.RelatedField):
+        raise Unsupported(field.field_name)
+    if kind is serializers.UUIDField and field.uuid_format == "hex_verbose":
+        return str
+    if kind is serializers.DateField:
+        output_format = getattr(field, "format", api_settings.DATE_FORMAT)
+        if output_format and output_format.lower() == ISO_8601:
+            return date.isoformat
+    if kind in (serializers.CharField, serializers.EmailField):
+        return str
+    if kind is serializers.IntegerField:
+        return int
+    if kind is serializers.BooleanField:
+        return bool
+    if isinstance(field, serializers.BaseSerializer):
+        raise Unsupported(field.field_name)
+    return field.to_representation
+
+
+class Projection:
+    def __init__(self, serializer_class, context=None):
+        serializer = serializer_class(context=context or {})
+        self.model = serializer.Meta.model
+        self.columns = []
+        self.plan = []
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.plan.append((name, METHOD, getattr(serializer, field.method_name)))
+            elif isinstance(field, serializers.ListSerializer):
+                self.plan.append((name, NESTED, self._nested(field, context)))
+            elif field.source == "*" or "." in field.source:
+                raise Unsupported(name)
+            else:
+                self.columns.append(field.source)
+                self.plan.append((name, COLUMN, (field.source, _converter(field))))
+        self.nested = any(kind == NESTED for _, kind, _ in self.plan)
+        self.key = self.model._meta.pk.attname
+
+    def _nested(self, field, context):
+        relation = self.model._meta.get_field(field.source)
+        if not isinstance(relation, ManyToOneRel):
+            raise Unsupported(field.field_name)
+        child = Projection(type(field.child), context)
+        return field.source, relation.field.attname, child
+
+    @classmethod
+    def for_serializer(cls, serializer_class, context=None):
+        """The projection, or ``None`` if the serializer has unsupported fields."""
+        try:
+            return cls(serializer_class, context)
+        except Unsupported:
+            return None
+
+    def values(self, queryset, *extra):
+        if self.nested:
+            extra = (*extra, self.key)
+        extra = list(dict.fromkeys(c for c in extra if c not in self.columns))
+        return queryset.prefetch_related(None).values(*self.columns, *extra)
+
+    def represent(self, rows):
+        rows = list(rows)
+        children = {
+            spec[0]: self._load_children(*spec, rows) for _, kind, spec in self.plan if kind == NESTED
+        }
+        out = []
+        for row in rows:
+            item = {}
+            for name, kind, spec in self.plan:
+                if kind == COLUMN:
+                    column, convert = spec
+                    value = row[column]
+                    item[name] = value if value is None or convert is None else convert(value)
+                elif kind == METHOD:
+                    item[name] = spec(_Row(row))
+                else:
+                    item[name] = children[spec[0]].get(row[self.key], [])
+            out.append(item)
+        return out
+
+    def _load_children(self, source, fk, child, rows):
+        grouped = defaultdict(list)
+        if not rows:
+            return grouped
+        related = self.model._meta.get_field(source).related_model
+        queryset = related._default_manager.filter(**{f"{fk}__in": [row[self.key] for row in rows]})
+        child_rows = list(queryset.values(*child.columns, **{PARENT: F(fk)}))
+        for row, item in zip(child_rows, child.represent(child_rows)):
+            grouped[row[PARENT]].append(item)
+        return grouped
+
+
+class ProjectedListMixin:
+    """Serve GET list responses through ``Projection`` when the serializer allows it."""
+
+    def list(self, request, *args, **kwargs):
+        projection = Projection.for_serializer(self.get_serializer_class(), self.get_serializer_context())
+        if projection is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = []
+        if hasattr(self.paginator, "get_ordering"):
+            ordering = [o.lstrip("-") for o in self.paginator.get_ordering(request, queryset, self)]
+        page = self.paginate_queryset(projection.values(queryset, *ordering))
+        if page is not None:
+            return self.get_paginated_response(projection.represent(page))
+        return Response(projection.represent(projection.values(queryset)))
@@ -0,0 +1,191 @@
+"""Streaming HTTP responses for large exports.
+
+Rows come from a server-side cursor (``QuerySet.iterator``) and are rendered
+into buffered chunks of a few dozen KB, so memory stays flat whatever the row
+count and the first bytes go out as soon as the header is rendered. CSV, JSON
+arrays and NDJSON are supported; ``?gzip=1`` compresses any of them on the fly
+into a ``.gz`` download. ``zip_chunks`` streams a ZIP archive entry by entry.
+
+Under ASGI (uvicorn in docker-compose) Django consumes a synchronous iterator
+completely before sending anything, so there the chunks are pulled through
+``sync_to_async`` one at a time instead.
+"""
+import csv
+import json
+import zipfile
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+from apps.projection import Projection
+
+CURSOR_CHUNK_SIZE = 2000  # rows per server-side cursor fetch
+BUFFER_BYTES = 64 * 1024
+
+
+class PassthroughRenderer(BaseRenderer):
+    """Lets ``?format=<format>`` through DRF content negotiation.
+
+    Views using it build their own streaming response, so nothing is rendered.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class CSVPassthroughRenderer(PassthroughRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONPassthroughRenderer(PassthroughRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+
+EXPORT_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, CSVPassthroughRenderer, NDJSONPassthroughRenderer]
+JSON_CONTENT_TYPES = {"json": "application/json", "ndjson": "application/x-ndjson"}
+
+
+class _Echo:
+    """File-like object for ``csv.writer`` that hands each rendered line back."""
+
+    def write(self, value):
+        return value
+
+
+def buffered(pieces, buffer_bytes=BUFFER_BYTES):
+    """Join small string pieces into chunks of roughly ``buffer_bytes``."""
+    buf, size = [], 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= buffer_bytes:
+            yield "".join(buf)
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf)
+
+
+def csv_chunks(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    yield from buffered(writer.writerow(row) for row in rows)
+
+
+def serialized_rows(serializer_class, queryset, context, chunk_size=None):
+    """Serialize ``queryset`` one cursor chunk at a time.
+
+    Uses a ``values()`` projection of the serializer (``apps.projection``)
+    when it supports every field; otherwise model instances go through the
+    serializer, with prefetches declared on the queryset run once per chunk.
+    """
+    chunk_size = chunk_size or CURSOR_CHUNK_SIZE
+    projection = Projection.for_serializer(serializer_class, context)
+    if projection is not None:
+        queryset = projection.values(queryset)
+        represent = projection.represent
+    else:
+        def represent(chunk):
+            return serializer_class(chunk, many=True, context=context).data
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield from represent(chunk)
+            chunk = []
+    if chunk:
+        yield from represent(chunk)
+
+
+def json_chunks(rows, fmt="json"):
+    """Encode rows as one JSON array, or one document per line for ``ndjson``."""
+    encode = json.JSONEncoder(default=str).encode
+    if fmt == "ndjson":
+        yield from buffered(encode(row) + "\n" for row in rows)
+        return
+    yield "["
+    yield from buffered(("," if i else "") + encode(row) for i, row in enumerate(rows))
+    yield "]"
+
+
+def gzipped(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ZipSink:
+    """Write-only file for ``zipfile``; written bytes are drained after each entry.
+
+    Having no ``seek``/``tell``, it makes ``zipfile`` write data descriptors
+    instead of rewinding to patch local headers.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_chunks(entries):
+    """Stream a deflated ZIP archive of ``(name, data)`` entries as they arrive."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def wants_gzip(request):
+    return request.GET.get("gzip", "").lower() in ("1", "true", "yes")
+
+
+async def _async_chunks(chunks):
+    chunks = iter(chunks)
+    done = object()
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await next_chunk(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type, filename):
+    if wants_gzip(request):
+        chunks = gzipped(chunks)
+        content_type = "application/gzip"
+        filename = f"{filename}.gz"
+    django_request = getattr(request, "_request", request)
+    if isinstance(django_request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+    resp = StreamingHttpResponse(chunks, content_type=content_type)
+    resp["Content-Disposition"] = f"attachment; filename={filename}"
+    return resp
+
+
+def streaming_csv(request, filename, header, rows):
+    return streaming_response(request, csv_chunks(header, rows), "text/csv", filename)
+
+
+def streaming_json(request, basename, fmt, rows):
+    return streaming_response(request, json_chunks(rows, fmt), JSON_CONTENT_TYPES[fmt], f"{basename}.{fmt}")
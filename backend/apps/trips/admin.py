@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import admin
 from .models import Trip, PickupPoint, TripPickup, TripSeat, Reservation
 
@@ -5,8 +6,14 @@ from .models import Trip, PickupPoint, TripPickup, TripSeat, Reservation
 class TripSeatInline(admin.TabularInline):
     model = TripSeat
     extra = 0
-    readonly_fields = ("seat_no",)
-    can_delete = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # Sparse storage only has exception rows, so staff must be able to add one for any seat
+        return () if settings.SPARSE_TRIP_SEATS else ("seat_no",)
+
+    def has_delete_permission(self, request, obj=None):
+        # ...and deleting an exception row is how a seat is unblocked again
+        return settings.SPARSE_TRIP_SEATS and super().has_delete_permission(request, obj)
 
 
 class TripPickupInline(admin.TabularInline):
@@ -0,0 +1,122 @@
+"""Seat allocation for reservations.
+
+Allocation is serialized per trip by taking a row lock on the trip before the
+free seats are computed, so two reservations on the same trip can never pick
+the same seat numbers. Conflicts that still slip through (a seat moved by hand
+while we were allocating, a deadlock victim) are retried with a short, bounded
+backoff before giving up.
+"""
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from apps.dashboard import cache as dashboard_cache
+
+from . import occupancy, seatmap, stats
+
+LINEAR = "linear"
+ADJACENT = "adjacent"
+MODES = (LINEAR, ADJACENT)
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 0.02  # seconds
+BACKOFF_CAP = 0.5  # seconds
+
+
+class AllocationConflict(Exception):
+    """Seats could not be allocated after all retries."""
+
+
+def lock_trip(trip_id):
+    """Lock the trip row until the surrounding transaction ends.
+
+    ``FOR NO KEY UPDATE`` serializes allocators among themselves without
+    blocking inserts that merely reference the trip (reservations, seats).
+    """
+    from .models import Trip
+
+    return (
+        Trip.objects.select_for_update(no_key=True)
+        .filter(pk=trip_id)
+        .values_list("pk", flat=True)
+        .get()
+    )
+
+
+def _backoff(attempt):
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt))
+    time.sleep(random.uniform(0, delay))
+
+
+def bulk_assign(reservation, seat_nos):
+    """Assign ``seat_nos`` to ``reservation`` with a single INSERT.
+
+    ``bulk_create`` fires no per-seat ``post_save`` signals, so the occupancy
+    bitmap, cached stats and dashboard are updated here and one ``seats.assigned`` event listing every seat
+    is published once the transaction commits.
+    """
+    from .models import SeatAssignment
+    from .signals import push_seats_assigned
+
+    seat_nos = list(seat_nos)
+    if not seat_nos:
+        return []
+    trip_id = reservation.trip_id
+    SeatAssignment.objects.bulk_create(
+        [
+            SeatAssignment(trip_id=trip_id, trip_date=reservation.trip_date, seat_no=seat_no, reservation=reservation)
+            for seat_no in seat_nos
+        ]
+    )
+    occupancy.mark_assigned(trip_id, seat_nos)
+    stats.invalidate(trip_id)
+    dashboard_cache.invalidate()
+    transaction.on_commit(lambda: push_seats_assigned(trip_id, reservation.pk, seat_nos))
+    return seat_nos
+
+
+def pick_seats(trip_id, occ, need, mode=LINEAR):
+    """Choose ``need`` free seats from the trip's occupancy.
+
+    ``ADJACENT`` looks for the best compact block on the bus type's seat map
+    and falls back to the lowest free seat numbers when none fits.
+    """
+    if mode == ADJACENT:
+        layout = seatmap.layout_for_trip(trip_id)
+        if layout is not None:
+            block = layout.find_block(occupancy.free_mask(occ.capacity, occ.blocked, occ.assigned), need)
+            if block is not None:
+                return block
+    return occ.first_free(need)
+
+
+def _allocate_locked(reservation, mode):
+    from .models import SeatAssignment
+
+    lock_trip(reservation.trip_id)
+    need = reservation.quantity - SeatAssignment.objects.filter(reservation=reservation).count()
+    if need <= 0:
+        return []
+    occ = occupancy.for_trip(reservation.trip_id)
+    return bulk_assign(reservation, pick_seats(reservation.trip_id, occ, need, mode))
+
+
+def allocate(reservation, mode=LINEAR, attempts=MAX_ATTEMPTS):
+    """Assign free seats to ``reservation`` up to its quantity.
+
+    Returns the newly assigned seat numbers, which may be fewer than requested
+    when the trip is full. Raises ``AllocationConflict`` if every attempt hit a
+    conflict.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return _allocate_locked(reservation, mode)
+        except (IntegrityError, OperationalError) as exc:
+            if attempt + 1 >= attempts:
+                raise AllocationConflict(str(exc)) from exc
+            if isinstance(exc, IntegrityError):
+                # A taken seat looked free: resync the bitmap before retrying.
+                occupancy.rebuild(reservation.trip_id)
+            _backoff(attempt)
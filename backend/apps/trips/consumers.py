@@ -17,6 +17,10 @@ class TripConsumer(AsyncJsonWebsocketConsumer):
         return
 
     async def broadcast(self, event):
-        """Handle messages broadcast via Django signals -> group_send."""
+        """Handle messages broadcast via Django signals -> group_send.
+
+        Payloads are forwarded unchanged, including aggregated ones such as
+        ``seats.assigned`` whose ``seat_nos`` lists every seat in the batch.
+        """
         data = event.get("data", {})
         await self.send_json(data)
@@ -0,0 +1,79 @@
+"""Expiry of HOLD reservations.
+
+Expired holds are found through the partial ``(status, hold_expires_at)``
+index, which only covers reservations still on hold, so a sweep costs the same
+however many historical reservations exist. Each batch is cancelled and its
+seats released with set-based statements; model signals are bypassed and one
+realtime event is published per affected trip instead.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import occupancy, stats
+
+BATCH_SIZE = 500
+
+
+def _release_seats(reservation_ids):
+    from .models import SeatAssignment
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SeatAssignment._meta.db_table} "
+            "WHERE reservation_id = ANY(%s::uuid[]) RETURNING trip_id, seat_no",
+            [[str(rid) for rid in reservation_ids]],
+        )
+        return cursor.fetchall()
+
+
+def expire_batch(now, batch_size=BATCH_SIZE):
+    """Cancel up to ``batch_size`` expired holds; returns how many were cancelled."""
+    from .models import Reservation
+    from .signals import push, push_dashboard
+
+    with transaction.atomic():
+        expired = list(
+            Reservation.objects.select_for_update(skip_locked=True)
+            .filter(status="HOLD", hold_expires_at__lte=now)
+            .order_by("hold_expires_at")
+            .values_list("id", "trip_id")[:batch_size]
+        )
+        if not expired:
+            return 0
+        ids = [rid for rid, _ in expired]
+        Reservation.objects.filter(id__in=ids).update(status="CANCELLED", updated_at=now)
+
+        per_trip = defaultdict(lambda: {"reservation_ids": [], "seat_nos": []})
+        for rid, trip_id in expired:
+            per_trip[trip_id]["reservation_ids"].append(str(rid))
+        for trip_id, seat_no in _release_seats(ids):
+            per_trip[trip_id]["seat_nos"].append(seat_no)
+        for trip_id, released in per_trip.items():
+            occupancy.mark_assigned(trip_id, released["seat_nos"], False)
+            occupancy.track_status(trip_id, "HOLD", "CANCELLED", len(released["reservation_ids"]))
+        stats.invalidate(*per_trip)
+
+        def notify():
+            for trip_id, released in per_trip.items():
+                push(trip_id, {
+                    "type": "holds.expired",
+                    "reservation_ids": released["reservation_ids"],
+                    "seat_nos": sorted(released["seat_nos"]),
+                })
+            push_dashboard({"type": "data.changed"})
+
+        transaction.on_commit(notify)
+    return len(expired)
+
+
+def expire_holds(now=None, batch_size=BATCH_SIZE):
+    """Cancel every hold that expired at or before ``now``."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        done = expire_batch(now, batch_size)
+        total += done
+        if done < batch_size:
+            return total
@@ -0,0 +1,111 @@
+"""Streaming CSV import of trips.
+
+The upload is decoded and parsed line by line, validated row by row and
+written in chunks through ``Trip.objects.bulk_create_with_seats``, so memory
+use is bounded by the chunk size and no per-trip signals fire. The chunks
+share one transaction: decoding is lazy, and a bad byte late in the file must
+not leave the earlier chunks behind, since trips have no key a corrected
+re-upload could dedupe on. Callers publish one summary event for the whole
+import.
+"""
+import codecs
+import csv
+import uuid
+from datetime import date
+
+from django.db import transaction
+
+from apps.fleet.models import Bus
+
+from .models import Trip
+
+CHUNK_SIZE = 500
+MAX_LENGTH = 120  # Trip.origin / Trip.destination
+
+
+class TripRowValidator:
+    """Validates CSV rows, resolving bus ids with one query per chunk."""
+
+    def __init__(self):
+        self.known_buses = set()
+        self.missing_buses = set()
+
+    def resolve_buses(self, rows):
+        wanted = set()
+        for _, row in rows:
+            bus_id = _parse_uuid(row.get("bus"))
+            if bus_id and bus_id not in self.known_buses and bus_id not in self.missing_buses:
+                wanted.add(bus_id)
+        if wanted:
+            found = set(Bus.objects.filter(pk__in=wanted).values_list("pk", flat=True))
+            self.known_buses |= found
+            self.missing_buses |= wanted - found
+
+    def validate(self, row):
+        errors = {}
+        trip_date = None
+        try:
+            trip_date = date.fromisoformat((row.get("trip_date") or "").strip())
+        except ValueError:
+            errors["trip_date"] = "invalid date, expected YYYY-MM-DD"
+        origin = (row.get("origin") or "").strip()
+        destination = (row.get("destination") or "").strip()
+        for field, value in (("origin", origin), ("destination", destination)):
+            if len(value) > MAX_LENGTH:
+                errors[field] = f"longer than {MAX_LENGTH} characters"
+        bus_id = None
+        raw_bus = (row.get("bus") or "").strip()
+        if raw_bus:
+            bus_id = _parse_uuid(raw_bus)
+            if bus_id is None or bus_id not in self.known_buses:
+                errors["bus"] = "unknown bus"
+        if errors:
+            return None, errors
+        return Trip(trip_date=trip_date, origin=origin, destination=destination, bus_id=bus_id), None
+
+
+def _parse_uuid(value):
+    try:
+        return uuid.UUID((value or "").strip())
+    except ValueError:
+        return None
+
+
+def _chunks(reader, size):
+    chunk = []
+    for row in reader:
+        chunk.append((reader.line_num, row))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_trips(upload, chunk_size=None):
+    """Import trips from a CSV upload.
+
+    Returns ``(created, errors)`` where ``errors`` lists
+    ``{"row": <line number>, "errors": {field: message}}`` for rejected rows.
+    Raises ``UnicodeDecodeError`` if the file is not UTF-8, in which case
+    nothing is imported.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    reader = csv.DictReader(codecs.iterdecode(upload, "utf-8-sig"))
+    validator = TripRowValidator()
+    created = 0
+    errors = []
+    with transaction.atomic():
+        for chunk in _chunks(reader, chunk_size):
+            validator.resolve_buses(chunk)
+            trips = []
+            for line, row in chunk:
+                trip, row_errors = validator.validate(row)
+                if row_errors:
+                    errors.append({"row": line, "errors": row_errors})
+                else:
+                    trips.append(trip)
+            if trips:
+                Trip.objects.bulk_create_with_seats(trips, batch_size=chunk_size)
+                created += len(trips)
+    return created, errors
@@ -0,0 +1,38 @@
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from apps.trips import occupancy, seatmap
+
+
+class Command(BaseCommand):
+    help = "Microbenchmark the linear and adjacent seat pickers on a synthetic coach."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seats", type=int, default=60)
+        parser.add_argument("--group", type=int, default=4)
+        parser.add_argument("--number", type=int, default=2000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, seats, group, number, seed, **options):
+        rng = random.Random(seed)
+        layout = seatmap.Layout(seatmap.default_rows(seats))
+        layout.candidates(group)  # compile outside the timed loop, as the cache would
+
+        self.stdout.write(f"{seats}-seat coach, group of {group}, {number} runs per fill level")
+        self.stdout.write(f"{'fill':>6} {'linear us':>10} {'adjacent us':>12} {'block found':>12}")
+        for fill in (0.0, 0.25, 0.5, 0.75, 0.9):
+            taken = rng.sample(range(1, seats + 1), int(seats * fill))
+            assigned = occupancy.from_seats(taken, seats)
+            blocked = occupancy.empty(seats)
+            free = occupancy.free_mask(seats, blocked, assigned)
+
+            linear = timeit.timeit(
+                lambda: occupancy.first_free(seats, blocked, assigned, group), number=number
+            )
+            adjacent = timeit.timeit(lambda: layout.find_block(free, group), number=number)
+            found = layout.find_block(free, group) is not None
+            self.stdout.write(
+                f"{fill:>6.0%} {linear / number * 1e6:>10.2f} {adjacent / number * 1e6:>12.2f} {str(found):>12}"
+            )
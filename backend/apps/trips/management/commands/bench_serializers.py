@@ -0,0 +1,63 @@
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.people.models import Client, Phone
+from apps.people.serializers import ClientSerializer
+from apps.projection import Projection
+from apps.trips.models import Trip
+from apps.trips.serializers import TripSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ModelSerializer output with the values() projection used for GET lists "
+        "and exports, for trips and clients. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=2000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, rows, repeat, **options):
+        with transaction.atomic():
+            tag = uuid.uuid4().hex[:8]
+            Trip.objects.bulk_create(
+                Trip(trip_date=date.today() + timedelta(days=i % 365), origin="A", destination=f"B{tag}", price=i)
+                for i in range(rows)
+            )
+            clients = Client.objects.bulk_create(
+                Client(first_name=f"F{i}", last_name=tag, birth_date=date(1990, 1, 1), tags=["bench"])
+                for i in range(rows)
+            )
+            Phone.objects.bulk_create(Phone(client=c, e164=f"+3897{i:07d}") for i, c in enumerate(clients))
+
+            request = Request(APIRequestFactory().get("/", HTTP_HOST="localhost"))
+            cases = (
+                ("trips", TripSerializer, Trip.objects.filter(destination=f"B{tag}")),
+                ("clients", ClientSerializer, Client.objects.filter(last_name=tag).prefetch_related("phones")),
+            )
+            for label, serializer_class, queryset in cases:
+                context = {"request": request}
+                projection = Projection(serializer_class, context)
+                runs = (
+                    ("serializer", lambda: serializer_class(queryset, many=True, context=context).data),
+                    ("projection", lambda: projection.represent(projection.values(queryset))),
+                )
+                outputs = []
+                for name, run in runs:
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        output = JSONRenderer().render(run())
+                        best = min(best, time.perf_counter() - start)
+                    outputs.append(output)
+                    self.stdout.write(f"{label:>8} {name:>10}: {best * 1000:.1f} ms, {best * 1e6 / rows:.1f} us per row")
+                self.stdout.write(f"{label:>8} identical output: {outputs[0] == outputs[1]}")
+            transaction.set_rollback(True)
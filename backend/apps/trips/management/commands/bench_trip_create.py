@@ -0,0 +1,51 @@
+import time
+import uuid
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.fleet.models import Bus, BusType
+from apps.trips.models import Trip
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare queries per created trip for Trip.objects.create and "
+        "Trip.objects.bulk_create_with_seats. Everything is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--trips", type=int, default=200)
+        parser.add_argument("--seats", type=int, default=60)
+
+    def handle(self, *args, trips, seats, **options):
+        with transaction.atomic():
+            bus_type = BusType.objects.create(name="bench", seats_count=seats)
+            bus = Bus.objects.create(plate=f"BENCH-{uuid.uuid4().hex[:8]}", bus_type=bus_type)
+
+            def build():
+                return [
+                    Trip(trip_date=date.today(), origin="A", destination=f"D{i}", bus_id=bus.pk)
+                    for i in range(trips)
+                ]
+
+            runs = (
+                ("create", lambda: [Trip.objects.create(**_fields(t)) for t in build()]),
+                ("bulk", lambda: Trip.objects.bulk_create_with_seats(build())),
+            )
+            for label, run in runs:
+                with CaptureQueriesContext(connection) as ctx:
+                    start = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"{label:>7}: {len(ctx)} queries, {len(ctx) / trips:.2f} per trip, "
+                    f"{elapsed * 1000 / trips:.2f} ms per trip"
+                )
+            transaction.set_rollback(True)
+
+
+def _fields(trip):
+    return {"trip_date": trip.trip_date, "origin": trip.origin, "destination": trip.destination, "bus_id": trip.bus_id}
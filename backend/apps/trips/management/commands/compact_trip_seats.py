@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from apps.trips import stats
+from apps.trips.models import Trip, TripSeat
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete TripSeat rows that carry no information (unblocked, no note). "
+        "Use after enabling SPARSE_TRIP_SEATS; seats without a row are ordinary seats of the bus layout."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Trips per DELETE statement.")
+
+    def handle(self, *args, batch_size, **options):
+        trip_ids = Trip.objects.order_by("pk").values_list("pk", flat=True)
+        removed = 0
+        batch = []
+        for trip_id in trip_ids.iterator(chunk_size=batch_size):
+            batch.append(trip_id)
+            if len(batch) == batch_size:
+                removed += self.compact(batch)
+                batch = []
+        if batch:
+            removed += self.compact(batch)
+        self.stdout.write(f"removed {removed} seat rows")
+
+    def compact(self, trip_ids):
+        # Unblocked rows have no bit set, so the per-row delete receivers have
+        # nothing to do; a raw DELETE skips loading the rows to send them.
+        rows = TripSeat.objects.filter(trip_id__in=trip_ids, blocked=False, note="")
+        removed = rows._raw_delete(rows.db)
+        stats.invalidate(*trip_ids)
+        return removed
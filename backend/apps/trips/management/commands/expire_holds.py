@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.trips.holds import BATCH_SIZE, expire_holds
+
+
+class Command(BaseCommand):
+    help = "Cancel HOLD reservations whose hold_expires_at has passed and release their seats."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--every", type=int, default=0,
+            help="Keep running and sweep every N seconds (default: sweep once and exit).",
+        )
+
+    def handle(self, *args, batch_size, every, **options):
+        while True:
+            count = expire_holds(batch_size=batch_size)
+            self.stdout.write(f"expired {count} holds")
+            if not every:
+                return
+            time.sleep(every)
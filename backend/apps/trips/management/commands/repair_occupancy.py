@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.trips import occupancy
+from apps.trips.models import Trip, TripOccupancy
+
+FIELDS = ["capacity", occupancy.BLOCKED, occupancy.ASSIGNED, *occupancy.COUNTERS]
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute trip occupancy bitmaps and counters from seats, assignments and reservations, "
+        "and fix the rows that drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Trips recomputed per round of queries.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report drifted rows.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        trip_ids = Trip.objects.order_by("pk").values_list("pk", flat=True)
+        repaired = created = 0
+        batch = []
+        for trip_id in trip_ids.iterator(chunk_size=batch_size):
+            batch.append(trip_id)
+            if len(batch) == batch_size:
+                r, c = self.repair(batch, dry_run)
+                repaired, created, batch = repaired + r, created + c, []
+        if batch:
+            r, c = self.repair(batch, dry_run)
+            repaired, created = repaired + r, created + c
+        verb = "would repair" if dry_run else "repaired"
+        self.stdout.write(f"{verb} {repaired} occupancy rows, {created} missing")
+
+    def repair(self, trip_ids, dry_run):
+        with transaction.atomic():
+            # Lock first so live seat updates queue behind the recount
+            current = {
+                occ.trip_id: occ
+                for occ in TripOccupancy.objects.select_for_update(no_key=True).filter(trip_id__in=trip_ids)
+            }
+            expected = occupancy.recompute(trip_ids)
+            drifted, missing = [], []
+            for trip_id, values in expected.items():
+                occ = current.get(trip_id)
+                if occ is None:
+                    missing.append(TripOccupancy(trip_id=trip_id, **values))
+                    continue
+                if any(_stored(getattr(occ, f)) != values[f] for f in FIELDS):
+                    for field, value in values.items():
+                        setattr(occ, field, value)
+                    drifted.append(occ)
+            if not dry_run:
+                TripOccupancy.objects.bulk_update(drifted, FIELDS)
+                TripOccupancy.objects.bulk_create(missing, ignore_conflicts=True)
+        return len(drifted), len(missing)
+
+
+def _stored(value):
+    return bytes(value) if isinstance(value, memoryview) else value
@@ -0,0 +1,105 @@
+"""Per-trip manifest data, loaded with a fixed number of queries.
+
+``load_manifests`` fetches occupancy and seat assignments (with passenger
+clients and their phones) for any number of trips in one query each, so the
+cost depends on neither bus size nor passenger count. The manifest CSV export,
+the bulk ZIP export and the trip report all read from it.
+"""
+import csv
+import io
+from collections import defaultdict
+
+from django.db.models import Prefetch
+
+from apps.people.models import Phone
+
+from . import occupancy
+from .models import SeatAssignment, TripOccupancy
+
+HEADER = ["Seat", "FirstName", "LastName", "Phone", "PassportID", "Pickup", "Status"]
+BATCH_SIZE = 50  # trips loaded per round of queries in bulk exports
+
+
+class TripManifest:
+    def __init__(self, trip, occ, assignments):
+        self.trip = trip
+        self.occupancy = occ
+        self.assignments = assignments  # ordered by seat_no
+
+    @property
+    def filename(self):
+        return f"manifest_{self.trip.trip_date}_{self.trip.destination}_{self.trip.id}.csv"
+
+    def rows(self):
+        """One CSV row per seat of the layout, passenger details where assigned."""
+        by_seat = {a.seat_no: a for a in self.assignments}
+        for seat_no in range(1, self.occupancy.capacity + 1):
+            yield passenger_row(seat_no, by_seat.get(seat_no))
+
+
+def passenger_row(seat_no, assignment):
+    if assignment is None:
+        return [seat_no, "", "", "", "", "", ""]
+    a = assignment
+    client = a.passenger_client
+    # Phones are prefetched primary first, so the first one is the one to show
+    phones = client.manifest_phones if client else []
+    fn = a.first_name or (client.first_name if client else "") or ""
+    ln = a.last_name or (client.last_name if client else "") or ""
+    phone = a.phone or (phones[0].e164 if phones else "")
+    passport = a.passport_id or (client.passport_id if client else "") or ""
+    return [seat_no, fn, ln, phone, passport, "", a.status]
+
+
+def load_manifests(trips, passengers=True):
+    """Load manifests for ``trips``, returned in the same order.
+
+    With ``passengers=False`` the passenger clients and phones are not
+    fetched, which is all the report needs.
+    """
+    trips = list(trips)
+    ids = [t.pk for t in trips]
+    occupancies = {o.trip_id: o for o in TripOccupancy.objects.filter(trip_id__in=ids)}
+    assignments = SeatAssignment.objects.filter(trip_id__in=ids).order_by("trip_id", "seat_no")
+    if passengers:
+        assignments = assignments.select_related("passenger_client").prefetch_related(
+            Prefetch(
+                "passenger_client__phones",
+                queryset=Phone.objects.order_by("-is_primary", "pk"),
+                to_attr="manifest_phones",
+            )
+        )
+    by_trip = defaultdict(list)
+    for a in assignments:
+        by_trip[a.trip_id].append(a)
+    return [
+        TripManifest(t, occupancies.get(t.pk) or occupancy.for_trip(t.pk), by_trip[t.pk])
+        for t in trips
+    ]
+
+
+def load_manifest(trip, passengers=True):
+    return load_manifests([trip], passengers)[0]
+
+
+def render_csv(rows):
+    """Render manifest rows to CSV text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def zip_entries(trips, batch_size=None):
+    """Yield ``(filename, csv)`` for each trip's manifest, for ``zip_chunks``.
+
+    Trips are loaded ``batch_size`` at a time with ``load_manifests`` and each
+    CSV is rendered inline as its entry is consumed, so a download abandoned
+    by the client leaves no worker threads behind.
+    """
+    trips = list(trips)
+    batch_size = batch_size or BATCH_SIZE
+    for start in range(0, len(trips), batch_size):
+        for manifest in load_manifests(trips[start:start + batch_size]):
+            yield f"manifest_{manifest.trip.id}.csv", render_csv(manifest.rows())
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+
+
+def from_seats(seat_nos, capacity):
+    # Frozen copy of apps.trips.occupancy.from_seats
+    value = 0
+    for seat_no in seat_nos:
+        if 1 <= seat_no <= capacity:
+            value |= 1 << (seat_no - 1)
+    return value.to_bytes((capacity + 7) // 8, "little")
+
+
+def build_occupancy(apps, schema_editor):
+    Trip = apps.get_model("trips", "Trip")
+    TripSeat = apps.get_model("trips", "TripSeat")
+    SeatAssignment = apps.get_model("trips", "SeatAssignment")
+    TripOccupancy = apps.get_model("trips", "TripOccupancy")
+
+    def seats_by_trip(queryset, trip_ids):
+        out = defaultdict(list)
+        for trip_id, seat_no in queryset.filter(trip_id__in=trip_ids).order_by().values_list("trip_id", "seat_no"):
+            out[trip_id].append(seat_no)
+        return out
+
+    def build(batch):
+        trip_ids = [pk for pk, _ in batch]
+        blocked = seats_by_trip(TripSeat.objects.filter(blocked=True), trip_ids)
+        assigned = seats_by_trip(SeatAssignment.objects.all(), trip_ids)
+        TripOccupancy.objects.bulk_create(
+            TripOccupancy(
+                trip_id=pk,
+                capacity=capacity or 0,
+                blocked=from_seats(blocked[pk], capacity or 0),
+                assigned=from_seats(assigned[pk], capacity or 0),
+            )
+            for pk, capacity in batch
+        )
+
+    trips = Trip.objects.order_by("pk").values_list("pk", "bus__bus_type__seats_count")
+    batch = []
+    for row in trips.iterator(chunk_size=BATCH_SIZE):
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            build(batch)
+            batch = []
+    if batch:
+        build(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fleet", "0001_initial"),
+        ("trips", "0002_trip_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TripOccupancy",
+            fields=[
+                (
+                    "trip",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="trips.trip",
+                    ),
+                ),
+                ("capacity", models.PositiveIntegerField(default=0)),
+                ("blocked", models.BinaryField(default=bytes)),
+                ("assigned", models.BinaryField(default=bytes)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="trip",
+            name="bus",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="trips",
+                to="fleet.bus",
+            ),
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0003_trip_occupancy"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(
+                condition=models.Q(("status", "HOLD")),
+                fields=["status", "hold_expires_at"],
+                name="trips_res_hold_expiry_idx",
+            ),
+        ),
+    ]
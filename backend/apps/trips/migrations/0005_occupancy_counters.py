@@ -0,0 +1,77 @@
+from django.db import migrations, models
+
+
+# Frozen copies of the helpers in apps.trips.occupancy
+STATUS_COUNTERS = {"HOLD": "held_count", "CANCELLED": "cancelled_count"}
+
+
+def to_int(bitmap):
+    return int.from_bytes(bytes(bitmap or b""), "little")
+
+
+def seat_counts(capacity, blocked, assigned):
+    blocked, assigned = to_int(blocked), to_int(assigned)
+    return {
+        "booked_count": assigned.bit_count(),
+        "blocked_count": blocked.bit_count(),
+        "free_count": (((1 << capacity) - 1) & ~(blocked | assigned)).bit_count(),
+    }
+
+
+def fill_counters(apps, schema_editor):
+    Reservation = apps.get_model("trips", "Reservation")
+    TripOccupancy = apps.get_model("trips", "TripOccupancy")
+
+    statuses = {
+        (row["trip_id"], row["status"]): row["n"]
+        for row in Reservation.objects.filter(status__in=STATUS_COUNTERS)
+        .values("trip_id", "status")
+        .annotate(n=models.Count("pk"))
+        .order_by()
+    }
+    rows = []
+    for occ in TripOccupancy.objects.iterator():
+        for field, value in seat_counts(occ.capacity, occ.blocked, occ.assigned).items():
+            setattr(occ, field, value)
+        for status, field in STATUS_COUNTERS.items():
+            setattr(occ, field, statuses.get((occ.trip_id, status), 0))
+        rows.append(occ)
+    TripOccupancy.objects.bulk_update(
+        rows, ["booked_count", "blocked_count", "free_count", *STATUS_COUNTERS.values()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0004_reservation_hold_expiry_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tripoccupancy",
+            name="blocked_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tripoccupancy",
+            name="booked_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tripoccupancy",
+            name="cancelled_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tripoccupancy",
+            name="free_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="tripoccupancy",
+            name="held_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
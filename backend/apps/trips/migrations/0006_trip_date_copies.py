@@ -0,0 +1,52 @@
+from django.db import migrations, models
+
+
+def copy_trip_dates(apps, schema_editor):
+    Trip = apps.get_model("trips", "Trip")
+    Reservation = apps.get_model("trips", "Reservation")
+    SeatAssignment = apps.get_model("trips", "SeatAssignment")
+
+    trip_date = models.Subquery(Trip.objects.filter(pk=models.OuterRef("trip_id")).values("trip_date")[:1])
+    Reservation.objects.update(trip_date=trip_date)
+    SeatAssignment.objects.update(trip_date=trip_date)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("trips", "0005_occupancy_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="reservation",
+            name="trip_date",
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="seatassignment",
+            name="trip_date",
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(copy_trip_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="reservation",
+            name="trip_date",
+            field=models.DateField(editable=False),
+        ),
+        migrations.AlterField(
+            model_name="seatassignment",
+            name="trip_date",
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="reservation",
+            index=models.Index(fields=["contact_client", "trip_date", "id"], name="trips_res_contact_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="seatassignment",
+            index=models.Index(
+                fields=["passenger_client", "trip_date", "reservation", "seat_no"], name="trips_seat_client_date_idx"
+            ),
+        ),
+    ]
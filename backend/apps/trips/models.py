@@ -4,6 +4,52 @@ from django.conf import settings
 from django.utils import timezone
 from apps.fleet.models import Bus, Chauffeur
 from apps.people.models import Client
+from apps.trips import occupancy
+
+class TripQuerySet(models.QuerySet):
+    def bulk_create_with_seats(self, trips, batch_size=500):
+        """Insert many trips together with their seats and occupancy rows.
+
+        Capacities for all buses come from one lookup, and trips, seats and
+        occupancy are each written with one bulk insert per batch. ``Trip.save``
+        is bypassed, so no per-trip ``post_save`` signals fire: callers publish
+        their own summary event.
+        """
+        trips = list(trips)
+        bus_ids = {t.bus_id for t in trips if t.bus_id}
+        capacities = dict(
+            Bus.objects.filter(pk__in=bus_ids).values_list("pk", "bus_type__seats_count")
+        ) if bus_ids else {}
+        with transaction.atomic(using=self.db):
+            self.bulk_create(trips, batch_size=batch_size)
+            seats, occupancies = [], []
+            for trip in trips:
+                capacity = capacities.get(trip.bus_id, 0)
+                seats += _seat_rows(trip.pk, capacity)
+                occupancies.append(_empty_occupancy(trip.pk, capacity))
+                trip._loaded_bus_id = trip.bus_id
+                trip._loaded_trip_date = trip.trip_date
+            TripSeat.objects.using(self.db).bulk_create(seats, batch_size=batch_size * 10)
+            TripOccupancy.objects.using(self.db).bulk_create(occupancies, batch_size=batch_size)
+        return trips
+
+
+def _seat_rows(trip_id, capacity):
+    # Sparse storage keeps only exception rows (blocked / annotated seats)
+    if settings.SPARSE_TRIP_SEATS:
+        return []
+    return [TripSeat(trip_id=trip_id, seat_no=i) for i in range(1, capacity + 1)]
+
+
+def _empty_occupancy(trip_id, capacity):
+    return TripOccupancy(
+        trip_id=trip_id,
+        capacity=capacity,
+        blocked=occupancy.empty(capacity),
+        assigned=occupancy.empty(capacity),
+        free_count=capacity,
+    )
+
 
 class Trip(models.Model):
     STATUS = [
@@ -27,41 +73,100 @@ class Trip(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TripQuerySet.as_manager()
+
     def __str__(self):
         # super().__str__() on a plain Model just returns "Trip object (pk)" — keep it simple:
         return f"{self.id} | {self.trip_date} | {self.origin} to {self.destination}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded bus and date so save() can detect a change without a SELECT
+        if "bus_id" in instance.__dict__:
+            instance._loaded_bus_id = instance.bus_id
+        if "trip_date" in instance.__dict__:
+            instance._loaded_trip_date = instance.trip_date
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        if fields is None or {"bus", "bus_id"} & set(fields):
+            self._loaded_bus_id = self.bus_id
+        if fields is None or "trip_date" in fields:
+            self._loaded_trip_date = self.trip_date
+
+    def bus_capacity(self):
+        if not self.bus_id:
+            return 0
+        if Trip.bus.is_cached(self) and self.bus is not None and Bus.bus_type.is_cached(self.bus):
+            return self.bus.bus_type.seats_count
+        return (
+            Bus.objects.filter(pk=self.bus_id).values_list("bus_type__seats_count", flat=True).first() or 0
+        )
+
     def save(self, *args, **kwargs):
         creating = self._state.adding
 
-        # Read original bus_id directly from DB (so we don't need to track it in __init__)
-        orig_bus_id = None
+        orig_bus_id = orig_trip_date = None
         if not creating and self.pk:
-            orig_bus_id = type(self).objects.filter(pk=self.pk).values_list("bus_id", flat=True).first()
+            if hasattr(self, "_loaded_bus_id") and hasattr(self, "_loaded_trip_date"):
+                orig_bus_id, orig_trip_date = self._loaded_bus_id, self._loaded_trip_date
+            else:
+                # Instance was not loaded from the DB (or fields were deferred): ask the DB
+                orig_bus_id, orig_trip_date = (
+                    type(self).objects.filter(pk=self.pk).values_list("bus_id", "trip_date").first() or (None, None)
+                )
 
         super().save(*args, **kwargs)
 
-        # Local import to avoid circular imports
-        from apps.trips.models import TripSeat
-
-        def build_seats():
-            # Only build when we truly have a bus AND it has a bus_type with seats_count
-            if not self.bus_id:
-                return
-            if not getattr(self.bus, "bus_type_id", None):
-                return
-            capacity = self.bus.bus_type.seats_count
-            TripSeat.objects.bulk_create(
-                [TripSeat(trip=self, seat_no=i) for i in range(1, capacity + 1)]
-            )
+        if not creating and orig_trip_date != self.trip_date:
+            # Keep the copies used by the client history index in step
+            Reservation.objects.filter(trip=self).update(trip_date=self.trip_date)
+            SeatAssignment.objects.filter(trip=self).update(trip_date=self.trip_date)
 
         if creating:
-            build_seats()
-        else:
+            capacity = self.bus_capacity()
+            TripSeat.objects.bulk_create(_seat_rows(self.pk, capacity))
+            _empty_occupancy(self.pk, capacity).save(force_insert=True)
+        elif orig_bus_id != self.bus_id:
             # If bus changed (including removed), rebuild appropriately
-            if orig_bus_id != self.bus_id:
-                TripSeat.objects.filter(trip=self).delete()
-                build_seats()
+            # Raw delete: no per-row signals, the occupancy is rebuilt below
+            seats = TripSeat.objects.filter(trip=self)
+            seats._raw_delete(seats.db)
+            capacity = self.bus_capacity()
+            TripSeat.objects.bulk_create(_seat_rows(self.pk, capacity))
+            occupancy.rebuild(self.pk, capacity)
+        self._loaded_bus_id = self.bus_id
+        self._loaded_trip_date = self.trip_date
+
+
+class TripOccupancy(models.Model):
+    """Seat occupancy bitmaps and counters for a trip, see ``apps.trips.occupancy``.
+
+    Kept in its own row so that saving a ``Trip`` never overwrites bits or
+    counters that were changed concurrently by seat assignments.
+    """
+
+    trip = models.OneToOneField(Trip, on_delete=models.CASCADE, primary_key=True, related_name="occupancy")
+    capacity = models.PositiveIntegerField(default=0)
+    blocked = models.BinaryField(default=bytes)
+    assigned = models.BinaryField(default=bytes)
+    booked_count = models.PositiveIntegerField(default=0)
+    blocked_count = models.PositiveIntegerField(default=0)
+    free_count = models.PositiveIntegerField(default=0)
+    held_count = models.PositiveIntegerField(default=0)  # reservations on HOLD
+    cancelled_count = models.PositiveIntegerField(default=0)  # CANCELLED reservations
+
+    def __str__(self):
+        return f"{self.trip_id} | {self.free_count}/{self.capacity}"
+
+    def first_free(self, n):
+        return occupancy.first_free(self.capacity, self.blocked, self.assigned, n)
+
+    def is_bookable(self, seat_no):
+        """Seat exists on this trip's layout and is not blocked."""
+        return 1 <= seat_no <= self.capacity and not occupancy.is_set(self.blocked, seat_no)
 
 
 class PickupPoint(models.Model):
@@ -115,6 +220,8 @@ class Reservation(models.Model):
         on_delete=models.CASCADE,
         related_name="reservations"
     )
+    # Copy of trip.trip_date, so the client history can walk an index (see apps.people.history)
+    trip_date = models.DateField(editable=False)
 
     contact_client = models.ForeignKey(
         Client,
@@ -141,31 +248,66 @@ class Reservation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
-    @transaction.atomic
-    def allocate_seats(self):
-        from apps.trips.models import SeatAssignment, TripSeat
-        taken = set(
-            SeatAssignment.objects.filter(trip=self.trip)
-            .values_list("seat_no", flat=True)
-        )
-        free = [
-            s.seat_no
-            for s in TripSeat.objects.filter(trip=self.trip, blocked=False).order_by("seat_no")
-            if s.seat_no not in taken
-        ]
-        need = self.quantity - SeatAssignment.objects.filter(reservation=self).count()
-        for seat_no in free[:need]:
-            SeatAssignment.objects.create(trip=self.trip, seat_no=seat_no, reservation=self)
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded status so the occupancy counters can follow transitions
+        if "status" in instance.__dict__:
+            instance._loaded_status = instance.status
+        if "trip_id" in instance.__dict__:
+            instance._loaded_trip_id = instance.trip_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        _save_with_trip_date(self, super().save, *args, **kwargs)
+
+    def allocate_seats(self, mode="linear"):
+        from apps.trips.allocation import allocate
+        return allocate(self, mode)
 
     def __str__(self):
         return f"{self.id} | {self.trip} | {self.status}"
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Only live holds are indexed, so the expiry sweep stays cheap (see apps.trips.holds)
+            models.Index(
+                fields=["status", "hold_expires_at"],
+                name="trips_res_hold_expiry_idx",
+                condition=models.Q(status="HOLD"),
+            ),
+            models.Index(fields=["contact_client", "trip_date", "id"], name="trips_res_contact_date_idx"),
+        ]
+
+def _save_with_trip_date(instance, super_save, *args, **kwargs):
+    """Save ``instance``, copying ``trip_date`` from its trip when it is new or moved to another trip."""
+    if instance.trip_date is None or getattr(instance, "_loaded_trip_id", None) != instance.trip_id:
+        instance.trip_date = instance.trip.trip_date
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "trip_date"}
+    super_save(*args, **kwargs)
+    instance._loaded_trip_id = instance.trip_id
+
+
+class SeatAssignmentQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Insert assignments, filling ``trip_date`` with one lookup for the trips missing it."""
+        objs = list(objs)
+        missing = {obj.trip_id for obj in objs if obj.trip_date is None}
+        if missing:
+            dates = dict(Trip.objects.filter(pk__in=missing).values_list("pk", "trip_date"))
+            for obj in objs:
+                if obj.trip_date is None:
+                    obj.trip_date = dates.get(obj.trip_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class SeatAssignment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     trip = models.ForeignKey(Trip, on_delete=models.CASCADE, related_name="assignments")
+    # Copy of trip.trip_date, so the client history can walk an index (see apps.people.history)
+    trip_date = models.DateField(editable=False)
     seat_no = models.PositiveIntegerField()
     reservation = models.ForeignKey(Reservation, on_delete=models.CASCADE, related_name="assignments")
     passenger_client = models.ForeignKey(Client, null=True, blank=True, on_delete=models.SET_NULL, related_name="seat_assignments")
@@ -175,7 +317,23 @@ class SeatAssignment(models.Model):
     passport_id = models.CharField(max_length=64, blank=True)
     status = models.CharField(max_length=12, default="HOLD")
 
+    objects = SeatAssignmentQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "trip_id" in instance.__dict__:
+            instance._loaded_trip_id = instance.trip_id
+        return instance
+
+    def save(self, *args, **kwargs):
+        _save_with_trip_date(self, super().save, *args, **kwargs)
 
     class Meta:
         unique_together = ("trip", "seat_no")
         ordering = ["seat_no"]
+        indexes = [
+            models.Index(
+                fields=["passenger_client", "trip_date", "reservation", "seat_no"], name="trips_seat_client_date_idx"
+            ),
+        ]
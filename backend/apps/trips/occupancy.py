@@ -0,0 +1,230 @@
+"""Per-trip seat occupancy bitmaps.
+
+Every trip has a ``TripOccupancy`` row holding its seat capacity and two bit
+arrays: one for blocked seats and one for assigned seats. Bit ``seat_no - 1``
+stands for seat ``seat_no``. Bits are numbered the way Postgres ``set_bit``
+numbers them on ``bytea`` (least significant bit of the first byte first), so
+the database can flip single bits in place without a read-modify-write, and
+Python can read a whole map as one little-endian integer.
+
+The row also carries counters for read paths that only need numbers: booked,
+blocked and free seats, recounted with ``bit_count`` by the same ``UPDATE``
+that flips the bits, and held and cancelled reservations, moved by the
+reservation signal receivers and the hold sweeper. ``recompute`` derives all
+of it from the seat, assignment and reservation rows (see the
+``repair_occupancy`` command).
+"""
+from collections import defaultdict
+
+from django.db.models import BinaryField, Case, Count, F, Func, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+
+BLOCKED = "blocked"
+ASSIGNED = "assigned"
+SEAT_COUNTERS = {BLOCKED: "blocked_count", ASSIGNED: "booked_count"}
+STATUS_COUNTERS = {"HOLD": "held_count", "CANCELLED": "cancelled_count"}
+COUNTERS = ["booked_count", "blocked_count", "free_count", *STATUS_COUNTERS.values()]
+
+
+def empty(capacity):
+    return bytes((capacity + 7) // 8)
+
+
+def to_int(bitmap):
+    return int.from_bytes(bytes(bitmap or b""), "little")
+
+
+def from_seats(seat_nos, capacity):
+    value = 0
+    for seat_no in seat_nos:
+        if 1 <= seat_no <= capacity:
+            value |= 1 << (seat_no - 1)
+    return value.to_bytes((capacity + 7) // 8, "little")
+
+
+def seats(bitmap):
+    """Seat numbers whose bit is set, in ascending order."""
+    value = to_int(bitmap)
+    out = []
+    while value:
+        low = value & -value
+        out.append(low.bit_length())
+        value ^= low
+    return out
+
+
+def is_set(bitmap, seat_no):
+    return seat_no >= 1 and bool(to_int(bitmap) >> (seat_no - 1) & 1)
+
+
+def count(bitmap):
+    return to_int(bitmap).bit_count()
+
+
+def free_mask(capacity, blocked, assigned):
+    return ((1 << capacity) - 1) & ~(to_int(blocked) | to_int(assigned))
+
+
+def free_count(capacity, blocked, assigned):
+    return free_mask(capacity, blocked, assigned).bit_count()
+
+
+def seat_counts(capacity, blocked, assigned):
+    return {
+        "booked_count": count(assigned),
+        "blocked_count": count(blocked),
+        "free_count": free_count(capacity, blocked, assigned),
+    }
+
+
+def first_free(capacity, blocked, assigned, n):
+    """The ``n`` lowest free seat numbers (fewer if the trip is full)."""
+    mask = free_mask(capacity, blocked, assigned)
+    out = []
+    while mask and len(out) < n:
+        low = mask & -mask
+        out.append(low.bit_length())
+        mask ^= low
+    return out
+
+
+class _Bits(Func):
+    """A ``bytea`` map as ``bit varying``, which has the bitwise operators ``bytea`` lacks.
+
+    Bit order differs from ``set_bit``'s, which does not matter for unions and
+    counts of maps of the same length.
+    """
+
+    template = "('x' || encode(%(expressions)s, 'hex'))::bit varying"
+    output_field = BinaryField()
+
+
+def _bit_count(expr):
+    return Func(expr, function="bit_count", output_field=IntegerField())
+
+
+def set_seats(trip_id, field, seat_nos, value):
+    """Set or clear the bits for ``seat_nos`` and recount the seats in one ``UPDATE``.
+
+    Seats outside the trip's capacity are not part of the layout and are
+    ignored, which also keeps ``set_bit`` within the bounds of the map.
+    """
+    from .models import TripOccupancy
+
+    seat_nos = sorted({seat_no for seat_no in seat_nos if seat_no >= 1}, reverse=True)
+    if not seat_nos:
+        return
+    # Capacity is only known to the row, so a seat past it writes the stored
+    # value of bit 0 back to bit 0 instead. Highest seats go first: every seat
+    # past the capacity is applied before any real change, when the stored
+    # bit 0 is still the current one.
+    original = Func(F(field), Value(0), function="get_bit", output_field=IntegerField())
+    expr = F(field)
+    for seat_no in seat_nos:
+        fits = Q(capacity__gte=seat_no)
+        expr = Func(
+            expr,
+            Case(When(fits, then=Value(seat_no - 1)), default=Value(0)),
+            Case(When(fits, then=Value(int(bool(value)))), default=original),
+            function="set_bit", output_field=BinaryField(),
+        )
+    other = F(ASSIGNED if field == BLOCKED else BLOCKED)
+    union = Func(_Bits(expr), _Bits(other), template="(%(expressions)s)", arg_joiner=" | ")
+    TripOccupancy.objects.filter(trip_id=trip_id, capacity__gte=seat_nos[-1]).update(
+        **{
+            field: expr,
+            SEAT_COUNTERS[field]: _bit_count(expr),
+            "free_count": F("capacity") - _bit_count(union),
+        }
+    )
+
+
+def track_status(trip_id, old, new, n=1):
+    """Move ``n`` reservations of a trip from status ``old`` to ``new`` in the counters.
+
+    ``None`` stands for a reservation being created or deleted.
+    """
+    from .models import TripOccupancy
+
+    if old == new:
+        return
+    updates = {}
+    if old in STATUS_COUNTERS:
+        field = STATUS_COUNTERS[old]
+        updates[field] = Greatest(F(field) - n, 0)
+    if new in STATUS_COUNTERS:
+        field = STATUS_COUNTERS[new]
+        updates[field] = F(field) + n
+    if updates:
+        TripOccupancy.objects.filter(trip_id=trip_id).update(**updates)
+
+
+def mark_assigned(trip_id, seat_nos, value=True):
+    set_seats(trip_id, ASSIGNED, seat_nos, value)
+
+
+def mark_blocked(trip_id, seat_nos, value=True):
+    set_seats(trip_id, BLOCKED, seat_nos, value)
+
+
+def recompute(trip_ids, capacities=None):
+    """Occupancy field values for ``trip_ids``, derived from the source rows.
+
+    Seats, assignments and reservation counts are read with one query each
+    for the whole batch. ``capacities`` maps trip ids to a capacity; trips not
+    in it use their bus type's seat count.
+    """
+    from .models import Reservation, SeatAssignment, Trip, TripSeat
+
+    trip_ids = list(trip_ids)
+    capacities = dict(capacities or {})
+    missing = [trip_id for trip_id in trip_ids if trip_id not in capacities]
+    if missing:
+        capacities.update(Trip.objects.filter(pk__in=missing).values_list("pk", "bus__bus_type__seats_count"))
+    blocked, assigned = defaultdict(list), defaultdict(list)
+    for trip_id, seat_no in TripSeat.objects.filter(trip_id__in=trip_ids, blocked=True).values_list("trip_id", "seat_no"):
+        blocked[trip_id].append(seat_no)
+    for trip_id, seat_no in SeatAssignment.objects.filter(trip_id__in=trip_ids).values_list("trip_id", "seat_no"):
+        assigned[trip_id].append(seat_no)
+    statuses = {
+        (row["trip_id"], row["status"]): row["n"]
+        for row in Reservation.objects.filter(trip_id__in=trip_ids, status__in=STATUS_COUNTERS)
+        .values("trip_id", "status")
+        .annotate(n=Count("pk"))
+        .order_by()
+    }
+    values = {}
+    for trip_id in trip_ids:
+        capacity = capacities.get(trip_id) or 0
+        blocked_map = from_seats(blocked[trip_id], capacity)
+        assigned_map = from_seats(assigned[trip_id], capacity)
+        values[trip_id] = {
+            "capacity": capacity,
+            BLOCKED: blocked_map,
+            ASSIGNED: assigned_map,
+            **seat_counts(capacity, blocked_map, assigned_map),
+            **{field: statuses.get((trip_id, status), 0) for status, field in STATUS_COUNTERS.items()},
+        }
+    return values
+
+
+def rebuild(trip_id, capacity=None):
+    """Recompute a trip's occupancy from its seat, assignment and reservation rows.
+
+    ``capacity`` defaults to the seat count of the trip's bus type.
+    """
+    from .models import TripOccupancy
+
+    capacities = {trip_id: capacity} if capacity is not None else None
+    occ, _ = TripOccupancy.objects.update_or_create(
+        trip_id=trip_id, defaults=recompute([trip_id], capacities)[trip_id]
+    )
+    return occ
+
+
+def for_trip(trip_id):
+    """The trip's occupancy, rebuilt if the row is missing (e.g. raw fixture loads)."""
+    from .models import TripOccupancy
+
+    occ = TripOccupancy.objects.filter(trip_id=trip_id).first()
+    return occ if occ is not None else rebuild(trip_id)
@@ -0,0 +1,125 @@
+"""Seat map compilation and adjacent-block search.
+
+``BusType.seat_map`` describes the cabin as rows of seat numbers, front to
+back, with ``null`` marking the aisle::
+
+    {"rows": [[1, 2, null, 3, 4], [5, 6, null, 7, 8], ...]}
+
+Bus types without a (valid) map get a 2+2 layout numbered row by row.
+
+A compiled ``Layout`` lists, per group size, every compact block of seats as a
+bitmask (same bit numbering as ``apps.trips.occupancy``), best block first.
+Finding seats for a group is then a scan of precomputed masks against the
+trip's free-seat mask. Layouts are cached per bus type and recompiled when the
+bus type's seat count or map changes.
+"""
+
+DEFAULT_SEATS_PER_ROW = 4
+
+_cache = {}
+
+
+def default_rows(seats_count, per_row=DEFAULT_SEATS_PER_ROW):
+    half = per_row // 2
+    rows = []
+    for start in range(1, seats_count + 1, per_row):
+        seats = list(range(start, min(start + per_row, seats_count + 1)))
+        rows.append(seats[:half] + [None] + seats[half:])
+    return rows
+
+
+def parse_rows(seat_map, seats_count):
+    rows = seat_map.get("rows") if isinstance(seat_map, dict) else None
+    if not isinstance(rows, list) or not rows:
+        return default_rows(seats_count)
+    parsed = []
+    for row in rows:
+        if not isinstance(row, list):
+            return default_rows(seats_count)
+        parsed.append([s if isinstance(s, int) and s > 0 else None for s in row])
+    return parsed
+
+
+class Layout:
+    def __init__(self, rows):
+        width = max((len(r) for r in rows), default=0)
+        self.rows = [r + [None] * (width - len(r)) for r in rows]
+        self.width = width
+        self._candidates = {}
+
+    def _block(self, r0, c0, c1, n):
+        """First ``n`` seats in reading order of the smallest row span from ``r0``."""
+        chosen = []
+        for r in range(r0, len(self.rows)):
+            for c in range(c0, c1 + 1):
+                seat = self.rows[r][c]
+                if seat is not None:
+                    chosen.append((r, c, seat))
+                    if len(chosen) == n:
+                        return chosen
+        return None
+
+    def _key(self, chosen):
+        rows = {}
+        for r, c, _ in chosen:
+            rows.setdefault(r, []).append(c)
+        crosses_aisle = any(
+            None in self.rows[r][min(cols):max(cols) + 1] for r, cols in rows.items()
+        )
+        cols = [c for _, c, _ in chosen]
+        return (len(rows), crosses_aisle, max(cols) - min(cols), chosen[0][0], chosen[0][1])
+
+    def candidates(self, n):
+        """``(mask, seats)`` pairs for blocks of ``n`` seats, best first."""
+        if n in self._candidates:
+            return self._candidates[n]
+        scored = []
+        for r0 in range(len(self.rows)):
+            for c0 in range(self.width):
+                for c1 in range(c0, self.width):
+                    chosen = self._block(r0, c0, c1, n)
+                    if chosen:
+                        scored.append((self._key(chosen), chosen))
+        scored.sort(key=lambda item: item[0])
+        out, seen = [], set()
+        for _, chosen in scored:
+            seats = sorted(seat for _, _, seat in chosen)
+            mask = 0
+            for seat in seats:
+                mask |= 1 << (seat - 1)
+            if mask not in seen:
+                seen.add(mask)
+                out.append((mask, seats))
+        self._candidates[n] = out
+        return out
+
+    def find_block(self, free_mask, n):
+        """Best block of ``n`` free seats, or ``None`` if no compact block fits."""
+        if n <= 0:
+            return []
+        for mask, seats in self.candidates(n):
+            if mask & free_mask == mask:
+                return seats
+        return None
+
+
+def layout_for(bus_type_id, seats_count, seat_map):
+    cached = _cache.get(bus_type_id)
+    if cached is not None and cached[0] == seats_count and cached[1] == seat_map:
+        return cached[2]
+    layout = Layout(parse_rows(seat_map, seats_count))
+    _cache[bus_type_id] = (seats_count, seat_map, layout)
+    return layout
+
+
+def layout_for_trip(trip_id):
+    from .models import Trip
+
+    row = (
+        Trip.objects.filter(pk=trip_id)
+        .values_list("bus__bus_type_id", "bus__bus_type__seats_count", "bus__bus_type__seat_map")
+        .first()
+    )
+    if not row or row[0] is None:
+        return None
+    return layout_for(*row)
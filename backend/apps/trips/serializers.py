@@ -1,9 +1,9 @@
 from rest_framework import serializers
-from django.urls import reverse
+from apps.links import LinksMixin, builder as link_builder
 from django.conf import settings
 from .models import Trip, Reservation, SeatAssignment
 
-class TripSerializer(serializers.ModelSerializer):
+class TripSerializer(LinksMixin, serializers.ModelSerializer):
     links = serializers.SerializerMethodField()
 
     class Meta:
@@ -12,17 +12,16 @@ class TripSerializer(serializers.ModelSerializer):
                   "return_time","price","status","notes","links")
 
     def get_links(self, obj):
-        req = self.context.get("request")
+        link = link_builder(self.context.get("request"))
         ui = settings.FRONTEND_BASE_URL
-        def abs_url(name, *args, **kwargs):
-            return req.build_absolute_uri(reverse(name, args=args, kwargs=kwargs)) if req else ""
+        report = link("trip-report", obj.id)
         return {
-            "api.self": abs_url("trip-detail", obj.id),
-            "api.seats": abs_url("trip-seats", obj.id),
-            "api.reserve": abs_url("trip-reserve", obj.id),
-            "api.manifest.csv": abs_url("export_manifest", obj.id),
-            "api.report": abs_url("trip-report", obj.id),
-            "api.report.json": f"{abs_url('trip-report', obj.id)}?format=json",
+            "api.self": link("trip-detail", obj.id),
+            "api.seats": link("trip-seats", obj.id),
+            "api.reserve": link("trip-reserve", obj.id),
+            "api.manifest.csv": link("export_manifest", obj.id),
+            "api.report": report,
+            "api.report.json": f"{report}?format=json",
             "ui.self": f"{ui}/trips/{obj.id}",
             "ui.manifest": f"{ui}/trips/{obj.id}?action=download-manifest",
         }
@@ -2,7 +2,9 @@ from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
-from .models import SeatAssignment, Reservation, Trip
+from apps.dashboard import cache as dashboard_cache
+from .models import SeatAssignment, Reservation, Trip, TripSeat
+from . import occupancy, stats
 
 
 channel_layer = get_channel_layer()
@@ -12,11 +14,21 @@ def push(trip_id, payload):
     async_to_sync(channel_layer.group_send)(f"trip_{trip_id}", {"type": "broadcast", "data": payload})
 
 
+def push_seats_assigned(trip_id, reservation_id, seat_nos):
+    """One event for a batch of seats inserted without per-row signals."""
+    push(trip_id, {
+        "type": "seats.assigned",
+        "reservation_id": str(reservation_id),
+        "seat_nos": sorted(seat_nos),
+    })
+
+
 def push_clients(payload):
     async_to_sync(channel_layer.group_send)("clients", {"type": "broadcast", "data": payload})
 
 
 def push_dashboard(payload):
+    dashboard_cache.invalidate()
     async_to_sync(channel_layer.group_send)("dashboard", {"type": "broadcast", "data": payload})
 
 
@@ -32,10 +44,82 @@ def seat_released(sender, instance, **kwargs):
 
 @receiver(pre_save, sender=SeatAssignment)
 def seat_moved(sender, instance, **kwargs):
+    instance._prev_seat_no = None
     if instance.pk:
-        prev = SeatAssignment.objects.get(pk=instance.pk)
-        if prev.seat_no != instance.seat_no:
-            push(instance.trip_id, {"type": "seat.released", "seat_no": prev.seat_no})
+        prev = SeatAssignment.objects.filter(pk=instance.pk).values_list("seat_no", flat=True).first()
+        if prev is not None and prev != instance.seat_no:
+            instance._prev_seat_no = prev
+            push(instance.trip_id, {"type": "seat.released", "seat_no": prev})
+
+
+@receiver(post_save, sender=SeatAssignment)
+def assignment_occupancy_saved(sender, instance, created, **kwargs):
+    prev = getattr(instance, "_prev_seat_no", None)
+    if prev is not None:
+        occupancy.mark_assigned(instance.trip_id, [prev], False)
+    if created or prev is not None:
+        occupancy.mark_assigned(instance.trip_id, [instance.seat_no])
+
+
+@receiver(post_delete, sender=SeatAssignment)
+def assignment_occupancy_deleted(sender, instance, **kwargs):
+    occupancy.mark_assigned(instance.trip_id, [instance.seat_no], False)
+
+
+@receiver(post_save, sender=TripSeat)
+def trip_seat_occupancy_saved(sender, instance, created, **kwargs):
+    if created and not instance.blocked:
+        return
+    occupancy.mark_blocked(instance.trip_id, [instance.seat_no], instance.blocked)
+    # The dashboard counts available seats
+    dashboard_cache.invalidate()
+
+
+@receiver(post_delete, sender=TripSeat)
+def trip_seat_occupancy_deleted(sender, instance, **kwargs):
+    # A seat without a row is an ordinary, bookable seat; an unblocked row's
+    # bit is already clear and its deletion changes no statistics. Bulk
+    # deletes of seat rows bypass this receiver (see compact_trip_seats).
+    if instance.blocked:
+        occupancy.mark_blocked(instance.trip_id, [instance.seat_no], False)
+        stats.invalidate(instance.trip_id)
+        dashboard_cache.invalidate()
+
+
+@receiver(pre_save, sender=Reservation)
+def reservation_prev_status(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._prev_status = None
+    elif hasattr(instance, "_loaded_status"):
+        instance._prev_status = instance._loaded_status
+    else:
+        instance._prev_status = Reservation.objects.filter(pk=instance.pk).values_list("status", flat=True).first()
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_occupancy_saved(sender, instance, **kwargs):
+    occupancy.track_status(instance.trip_id, getattr(instance, "_prev_status", None), instance.status)
+    instance._loaded_status = instance.status
+
+
+@receiver(post_delete, sender=Reservation)
+def reservation_occupancy_deleted(sender, instance, **kwargs):
+    occupancy.track_status(instance.trip_id, getattr(instance, "_loaded_status", instance.status), None)
+
+
+@receiver(post_save, sender=SeatAssignment)
+@receiver(post_delete, sender=SeatAssignment)
+@receiver(post_save, sender=TripSeat)
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def trip_stats_changed(sender, instance, **kwargs):
+    stats.invalidate(instance.trip_id)
+
+
+@receiver(post_save, sender=Trip)
+def trip_stats_trip_saved(sender, instance, **kwargs):
+    # A bus change rebuilds the seats and occupancy
+    stats.invalidate(instance.pk)
 
 
 @receiver(post_save, sender=Reservation)
@@ -0,0 +1,57 @@
+"""Cached per-trip report statistics.
+
+``compute`` reads the occupancy counters (see ``apps.trips.occupancy``) in one
+query. Results are cached per trip and dropped by the ``SeatAssignment``,
+``TripSeat``, ``Reservation`` and ``Trip`` signal receivers, and by the bulk
+paths that bypass signals (seat allocation, hold expiry, seat row compaction).
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from . import occupancy
+from .models import TripOccupancy
+
+CACHE_TIMEOUT = 300
+
+
+def cache_key(trip_id):
+    return f"trips:stats:{trip_id}"
+
+
+def _query(trip_id):
+    return (
+        TripOccupancy.objects.filter(trip_id=trip_id)
+        .values("capacity", "booked_count", "free_count", "held_count", "cancelled_count")
+        .first()
+    )
+
+
+def compute(trip_id):
+    row = _query(trip_id)
+    if row is None:
+        # Trips loaded without Trip.save() may lack their occupancy row
+        occupancy.for_trip(trip_id)
+        row = _query(trip_id)
+    return {
+        "total": row["capacity"],
+        "booked": row["booked_count"],
+        "available": row["free_count"],
+        "held": row["held_count"],
+        "cancellations": row["cancelled_count"],
+    }
+
+
+def for_trip(trip_id):
+    key = cache_key(trip_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute(trip_id)
+        cache.set(key, stats, CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate(*trip_ids):
+    keys = [cache_key(trip_id) for trip_id in trip_ids]
+    cache.delete_many(keys)
+    # Again after commit, in case a concurrent request cached pre-commit numbers
+    transaction.on_commit(lambda: cache.delete_many(keys))
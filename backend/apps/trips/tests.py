@@ -1,14 +1,33 @@
 import csv
-from datetime import date
+import gzip
+import io
+import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
 from django.urls import reverse
-from django.test import TestCase
-from rest_framework.test import APIClient
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
 from django.contrib.auth import get_user_model
 from apps.fleet.models import BusType, Bus
-from apps.people.models import Client
-from .models import Trip, TripSeat, SeatAssignment, Reservation
+from apps.people.models import Client, Phone
+from apps.projection import Projection
+from apps.streaming import csv_chunks, streaming_response
+from .models import Trip, TripSeat, SeatAssignment, Reservation, TripOccupancy
+from . import occupancy, seatmap, stats as trip_stats
+from .serializers import TripSerializer, ReservationSerializer, SeatAssignmentSerializer
+from .holds import expire_holds
 from django.core.files.uploadedfile import SimpleUploadedFile
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
+from asgiref.sync import async_to_sync
+from .consumers import TripConsumer
 
 class TestTripSeats(TestCase):
     def setUp(self):
@@ -86,6 +105,48 @@ class TestManifest(TestCase):
         self.assertEqual(len(lines)-1, 2)
 
 
+class TestManifestQueries(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Coach", seats_count=60)
+        bus = Bus.objects.create(plate="B60", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        user = get_user_model().objects.create_user("mq", password="p")
+        reservation = Reservation.objects.create(trip=self.trip, quantity=50, created_by=user, updated_by=user)
+        clients = Client.objects.bulk_create([Client(first_name=f"F{i}", last_name="L") for i in range(50)])
+        Phone.objects.bulk_create(
+            [Phone(client=c, e164=f"+3897000{i:04d}") for i, c in enumerate(clients)]
+            + [Phone(client=c, e164=f"+3897100{i:04d}", is_primary=True) for i, c in enumerate(clients)]
+        )
+        SeatAssignment.objects.bulk_create(
+            SeatAssignment(trip=self.trip, seat_no=i + 1, reservation=reservation, passenger_client=c)
+            for i, c in enumerate(clients)
+        )
+
+    def test_manifest_query_count_is_fixed(self):
+        url = reverse("export_manifest", args=[self.trip.id])
+        # trip, occupancy, assignments joined with clients, phones
+        with self.assertNumQueries(4):
+            resp = self.client.get(url)
+        rows = list(csv.reader(resp.content.decode().splitlines()))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual(rows[1][:4], ["1", "F0", "L", "+38971000000"])
+        self.assertEqual(rows[60], ["60", "", "", "", "", "", ""])
+
+    def test_bulk_zip_export_batches_queries(self):
+        others = [Trip.objects.create(trip_date=date.today(), origin="A", destination=f"C{i}") for i in range(2)]
+        ids = [str(self.trip.id)] + [str(t.id) for t in others]
+        api = APIClient()
+        api.force_authenticate(get_user_model().objects.get(username="mq"))
+        # trips, then occupancy, assignments with clients and phones for the whole batch
+        with self.assertNumQueries(4):
+            resp = api.post(reverse("trip-bulk"), {"ids": ids, "action": "export_manifests"}, format="json")
+            archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), sorted(f"manifest_{i}.csv" for i in ids))
+        rows = list(csv.reader(archive.read(f"manifest_{self.trip.id}.csv").decode().splitlines()))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual(rows[1][:4], ["1", "F0", "L", "+38971000000"])
+
+
 class TestTripReport(TestCase):
     def setUp(self):
         bt = BusType.objects.create(name="Mini", seats_count=3)
@@ -114,6 +175,68 @@ class TestTripReport(TestCase):
         self.assertEqual(resp2.data["stats"]["booked"], 0)
         self.assertEqual(resp2.data["stats"]["cancellations"], 1)
 
+    def test_stats_single_query_cached_and_invalidated(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(trip_stats.compute(self.trip.id)["booked"], 2)
+        url = reverse("trip-report", args=[self.trip.id]) + "?stats_only=1"
+        self.client.get(url)
+        with self.assertNumQueries(1):  # the trip lookup; stats come from the cache
+            resp = self.client.get(url)
+        self.assertNotIn("manifest", resp.data)
+        self.assertEqual(resp.data["stats"]["booked"], 2)
+
+        SeatAssignment.objects.filter(trip=self.trip).first().delete()
+        self.assertEqual(self.client.get(url).data["stats"]["booked"], 1)
+        seat = TripSeat.objects.get(trip=self.trip, seat_no=3)
+        seat.blocked = True
+        seat.save()
+        self.assertEqual(self.client.get(url).data["stats"]["available"], 1)
+        seat.delete()
+        self.assertEqual(self.client.get(url).data["stats"]["available"], 2)
+
+
+class TestProjectedSerialization(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        bus = Bus.objects.create(plate="BP1", bus_type=bt)
+        self.user = get_user_model().objects.create_user("pj", password="p")
+        self.trip = Trip.objects.create(
+            trip_date=date(2030, 5, 1), origin="A", destination="B", bus=bus, price="12.5", notes="n",
+        )
+        Trip.objects.create(trip_date=date(2030, 5, 2), origin="A", destination="C")
+        contact = Client.objects.create(first_name="P", last_name="J")
+        reservation = Reservation.objects.create(
+            trip=self.trip, contact_client=contact, quantity=1, created_by=self.user, updated_by=self.user,
+        )
+        Reservation.objects.create(trip=self.trip, quantity=1, created_by=self.user, updated_by=self.user)
+        SeatAssignment.objects.create(
+            trip=self.trip, seat_no=2, reservation=reservation, passenger_client=contact, first_name="P",
+        )
+
+    def assertParity(self, serializer_class, queryset, path="/"):
+        request = Request(APIRequestFactory().get(path, HTTP_HOST="localhost"))
+        context = {"request": request}
+        projection = Projection.for_serializer(serializer_class, context)
+        self.assertIsNotNone(projection)
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        self.assertEqual(JSONRenderer().render(projection.represent(projection.values(queryset))), expected)
+
+    def test_projection_matches_serializers(self):
+        self.assertParity(TripSerializer, Trip.objects.order_by("trip_date"))
+        self.assertParity(TripSerializer, Trip.objects.order_by("trip_date"), "/?links=0")
+        self.assertParity(ReservationSerializer, Reservation.objects.all())
+        self.assertParity(SeatAssignmentSerializer, SeatAssignment.objects.all())
+
+    def test_list_endpoints_use_projection(self):
+        api = APIClient()
+        api.force_authenticate(self.user)
+        resp = api.get(reverse("trip-list"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([t["trip_date"] for t in resp.data["results"]], ["2030-05-02", "2030-05-01"])
+        self.assertEqual(resp.data["results"][1], TripSerializer(self.trip, context={"request": resp.wsgi_request}).data)
+        resp = api.get(reverse("reservation-list"), {"trip": str(self.trip.id)})
+        self.assertEqual(len(resp.data["results"]), 2)
+
 
 class TestTripCRUD(TestCase):
     def setUp(self):
@@ -239,3 +362,452 @@ class TestSeatDragDropSignal(TestCase):
             url_assign = reverse("assignment-detail", args=[self.assignment.id])
             self.client.patch(url_assign, {"seat_no": 2}, format="json")
             self.assertTrue(mock_push.called)
+
+
+class TestConcurrentReserve(TransactionTestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Coach", seats_count=30)
+        bus = Bus.objects.create(plate="B13", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        self.user = get_user_model().objects.create_user("cc", password="p")
+
+    def test_parallel_reserve_no_double_booking(self):
+        url = reverse("trip-reserve", args=[self.trip.id])
+        callers = 40
+        barrier = threading.Barrier(callers)
+
+        def reserve(_):
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                return client.post(url, {"quantity": 2}, format="json").status_code
+            except Exception:
+                return 500
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=callers) as pool:
+            codes = list(pool.map(reserve, range(callers)))
+
+        self.assertNotIn(500, codes)
+        self.assertTrue(set(codes) <= {201, 409})
+        self.assertEqual(codes.count(201), 15)
+        seats = list(SeatAssignment.objects.filter(trip=self.trip).values_list("seat_no", flat=True))
+        self.assertEqual(len(seats), 30)
+        self.assertEqual(len(set(seats)), 30)
+        for r in Reservation.objects.filter(trip=self.trip):
+            self.assertEqual(r.assignments.count(), 2)
+
+
+class TestOccupancyBitmap(SimpleTestCase):
+    def test_bit_operations(self):
+        blocked = occupancy.from_seats([1, 3], 10)
+        assigned = occupancy.from_seats([2, 10], 10)
+        self.assertEqual(occupancy.seats(blocked), [1, 3])
+        self.assertEqual(occupancy.free_count(10, blocked, assigned), 6)
+        self.assertEqual(occupancy.first_free(10, blocked, assigned, 2), [4, 5])
+        self.assertEqual(occupancy.first_free(10, blocked, assigned, 20), [4, 5, 6, 7, 8, 9])
+        self.assertEqual(occupancy.free_count(0, b"", b""), 0)
+
+
+class TestOccupancySync(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        bus = Bus.objects.create(plate="B14", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        self.user = get_user_model().objects.create_user("oc", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def occ(self):
+        return TripOccupancy.objects.get(trip=self.trip)
+
+    def test_bitmap_follows_blocks_and_assignments(self):
+        self.assertEqual(self.occ().capacity, 4)
+        self.assertEqual(self.occ().free_count, 4)
+
+        seat = TripSeat.objects.get(trip=self.trip, seat_no=1)
+        seat.blocked = True
+        seat.save()
+        self.assertEqual(occupancy.seats(self.occ().blocked), [1])
+
+        r = self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 2}, format="json")
+        self.assertEqual(r.data["assigned_seats"], [2, 3])
+        self.assertEqual(occupancy.seats(self.occ().assigned), [2, 3])
+        self.assertEqual(self.occ().free_count, 1)
+
+        assign = SeatAssignment.objects.get(trip=self.trip, seat_no=3)
+        self.client.patch(reverse("assignment-detail", args=[assign.id]), {"seat_no": 4}, format="json")
+        self.assertEqual(occupancy.seats(self.occ().assigned), [2, 4])
+
+        res_url = reverse("reservation-detail", args=[r.data["reservation_id"]])
+        self.client.patch(res_url, {"status": "CANCELLED"}, format="json")
+        self.assertEqual(occupancy.seats(self.occ().assigned), [])
+        self.assertEqual(self.occ().free_count, 3)
+
+    def test_counters_move_with_the_bits_in_one_statement(self):
+        occupancy.mark_assigned(self.trip.id, [1, 2])
+        with self.assertNumQueries(1):
+            occupancy.mark_blocked(self.trip.id, [2, 3])
+        occ = self.occ()
+        # seat 2 is both assigned and blocked and counts once against the free seats
+        self.assertEqual((occ.booked_count, occ.blocked_count, occ.free_count), (2, 2, 1))
+
+    def test_seats_past_capacity_are_skipped_not_the_whole_update(self):
+        occupancy.mark_blocked(self.trip.id, [2, 9])
+        occupancy.mark_assigned(self.trip.id, [1, 7])
+        occ = self.occ()
+        self.assertEqual((occupancy.seats(occ.blocked), occupancy.seats(occ.assigned)), ([2], [1]))
+        self.assertEqual((occ.booked_count, occ.blocked_count, occ.free_count), (1, 1, 2))
+        occupancy.mark_assigned(self.trip.id, [5])
+        self.assertEqual(occupancy.seats(self.occ().assigned), [1])
+
+    def test_deleting_blocked_seat_row_frees_the_seat(self):
+        TripSeat.objects.filter(trip=self.trip).exclude(seat_no=1).update(blocked=True)
+        occupancy.rebuild(self.trip.id)
+        seat = TripSeat.objects.get(trip=self.trip, seat_no=4)
+        seat.blocked = True
+        seat.save()
+        self.assertEqual(self.occ().free_count, 1)
+
+        seat.delete()
+        self.assertEqual(occupancy.seats(self.occ().blocked), [2, 3])
+        self.assertEqual((self.occ().blocked_count, self.occ().free_count), (2, 2))
+        r = self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 2}, format="json")
+        self.assertEqual(r.data["assigned_seats"], [1, 4])
+
+    def counters(self):
+        return {f: getattr(self.occ(), f) for f in occupancy.COUNTERS}
+
+    def test_counters_follow_reservations_and_repair(self):
+        seat = TripSeat.objects.get(trip=self.trip, seat_no=4)
+        seat.blocked = True
+        seat.save()
+        first = self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 2}, format="json")
+        self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 1}, format="json")
+        self.assertEqual(self.counters(), {
+            "booked_count": 3, "blocked_count": 1, "free_count": 0, "held_count": 2, "cancelled_count": 0,
+        })
+
+        self.client.patch(
+            reverse("reservation-detail", args=[first.data["reservation_id"]]), {"status": "CANCELLED"}, format="json"
+        )
+        self.assertEqual(self.counters()["held_count"], 1)
+        Reservation.objects.filter(trip=self.trip).update(hold_expires_at=timezone.now() - timedelta(minutes=1))
+        expire_holds()
+        self.assertEqual(self.counters(), {
+            "booked_count": 0, "blocked_count": 1, "free_count": 3, "held_count": 0, "cancelled_count": 2,
+        })
+
+        Reservation.objects.filter(trip=self.trip).delete()
+        self.assertEqual(self.occ().cancelled_count, 0)
+
+        TripOccupancy.objects.filter(trip=self.trip).update(free_count=99, held_count=5)
+        out = io.StringIO()
+        call_command("repair_occupancy", stdout=out)
+        self.assertIn("repaired 1 occupancy rows", out.getvalue())
+        self.assertEqual(self.counters(), {
+            "booked_count": 0, "blocked_count": 1, "free_count": 3, "held_count": 0, "cancelled_count": 0,
+        })
+
+
+class TestBulkSeatEvent(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        bus = Bus.objects.create(plate="B15", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        self.user = get_user_model().objects.create_user("be", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_group_booking_publishes_one_event(self):
+        url = reverse("trip-reserve", args=[self.trip.id])
+        with patch("apps.trips.signals.push") as mock_push:
+            with self.captureOnCommitCallbacks(execute=True):
+                r = self.client.post(url, {"quantity": 3}, format="json")
+        self.assertEqual(r.status_code, 201)
+        seat_events = [
+            c.args[1] for c in mock_push.call_args_list if c.args[1]["type"].startswith("seat")
+        ]
+        self.assertEqual(len(seat_events), 1)
+        self.assertEqual(seat_events[0]["type"], "seats.assigned")
+        self.assertEqual(seat_events[0]["seat_nos"], [1, 2, 3])
+        self.assertEqual(seat_events[0]["reservation_id"], r.data["reservation_id"])
+
+    def test_consumer_forwards_aggregated_event(self):
+        consumer = TripConsumer()
+        consumer.send_json = AsyncMock()
+        payload = {"type": "seats.assigned", "reservation_id": "r", "seat_nos": [1, 2]}
+        async_to_sync(consumer.broadcast)({"type": "broadcast", "data": payload})
+        consumer.send_json.assert_awaited_once_with(payload)
+
+
+class TestSeatMapLayout(SimpleTestCase):
+    def test_default_layout_and_block_search(self):
+        self.assertEqual(seatmap.default_rows(8), [[1, 2, None, 3, 4], [5, 6, None, 7, 8]])
+        layout = seatmap.Layout(seatmap.default_rows(8))
+        free = occupancy.free_mask(8, occupancy.empty(8), occupancy.from_seats([2, 3], 8))
+        self.assertEqual(layout.find_block(free, 2), [5, 6])
+        self.assertEqual(layout.find_block(free, 4), [5, 6, 7, 8])
+        self.assertIsNone(layout.find_block(free, 5))
+
+    def test_custom_map_and_cache(self):
+        seat_map = {"rows": [[1, 2, None, 3], [4, 5, None, 6]]}
+        layout = seatmap.layout_for("bt-1", 6, seat_map)
+        self.assertIs(seatmap.layout_for("bt-1", 6, seat_map), layout)
+        free = occupancy.free_mask(6, occupancy.empty(6), occupancy.from_seats([1], 6))
+        self.assertEqual(layout.find_block(free, 2), [4, 5])
+        changed = {"rows": [[1, None, 2, 3], [4, None, 5, 6]]}
+        self.assertIsNot(seatmap.layout_for("bt-1", 6, changed), layout)
+
+
+class TestAdjacentReserve(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=8)
+        bus = Bus.objects.create(plate="B16", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        seat = TripSeat.objects.get(trip=self.trip, seat_no=2)
+        seat.blocked = True
+        seat.save()
+        self.user = get_user_model().objects.create_user("ad", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_adjacent_keeps_group_together(self):
+        url = reverse("trip-reserve", args=[self.trip.id])
+        r = self.client.post(url, {"quantity": 2, "allocation": "adjacent"}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["assigned_seats"], [3, 4])
+        r = self.client.post(url, {"quantity": 2}, format="json")
+        self.assertEqual(r.data["assigned_seats"], [1, 5])
+        r = self.client.post(url, {"quantity": 1, "allocation": "window"}, format="json")
+        self.assertEqual(r.status_code, 400)
+
+
+class TestHoldExpiry(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=6)
+        bus = Bus.objects.create(plate="B17", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        self.user = get_user_model().objects.create_user("hx", password="p")
+        now = timezone.now()
+        self.expired = self.reserve(2, "HOLD", now - timedelta(minutes=5))
+        self.live = self.reserve(1, "HOLD", now + timedelta(minutes=5))
+        self.confirmed = self.reserve(1, "CONFIRMED", now - timedelta(minutes=5))
+
+    def reserve(self, quantity, status, expires):
+        r = Reservation.objects.create(
+            trip=self.trip, quantity=quantity, status=status, hold_expires_at=expires,
+            created_by=self.user, updated_by=self.user,
+        )
+        r.allocate_seats()
+        return r
+
+    def test_sweep_cancels_expired_holds_and_releases_seats(self):
+        with patch("apps.trips.signals.push") as mock_push:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(expire_holds(batch_size=1), 1)
+        self.expired.refresh_from_db()
+        self.live.refresh_from_db()
+        self.confirmed.refresh_from_db()
+        self.assertEqual(self.expired.status, "CANCELLED")
+        self.assertEqual(self.live.status, "HOLD")
+        self.assertEqual(self.confirmed.status, "CONFIRMED")
+        self.assertFalse(SeatAssignment.objects.filter(reservation=self.expired).exists())
+        self.assertEqual(occupancy.seats(TripOccupancy.objects.get(trip=self.trip).assigned), [3, 4])
+        mock_push.assert_called_once_with(
+            self.trip.id,
+            {"type": "holds.expired", "reservation_ids": [str(self.expired.id)], "seat_nos": [1, 2]},
+        )
+        self.assertEqual(expire_holds(), 0)
+
+
+@override_settings(SPARSE_TRIP_SEATS=True)
+class TestSparseSeats(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        bus = Bus.objects.create(plate="B18", bus_type=bt)
+        self.trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=bus)
+        self.user = get_user_model().objects.create_user("sp", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_virtual_layout(self):
+        self.assertEqual(TripSeat.objects.filter(trip=self.trip).count(), 0)
+        TripSeat.objects.create(trip=self.trip, seat_no=3, blocked=True, note="broken")
+
+        r = self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 2}, format="json")
+        self.assertEqual(r.data["assigned_seats"], [1, 2])
+
+        report = self.client.get(reverse("trip-report", args=[self.trip.id])).data["stats"]
+        self.assertEqual((report["total"], report["booked"], report["available"]), (4, 2, 1))
+
+        lines = self.client.get(reverse("export_manifest", args=[self.trip.id])).content.decode().strip().splitlines()
+        self.assertEqual(len(lines) - 1, 4)
+
+        assign = SeatAssignment.objects.get(trip=self.trip, seat_no=2)
+        url = reverse("assignment-detail", args=[assign.id])
+        self.assertEqual(self.client.patch(url, {"seat_no": 3}, format="json").status_code, 400)
+        self.assertEqual(self.client.patch(url, {"seat_no": 5}, format="json").status_code, 400)
+        self.assertEqual(self.client.patch(url, {"seat_no": 4}, format="json").status_code, 200)
+
+    def test_deleting_exception_row_unblocks_seat(self):
+        exception = TripSeat.objects.create(trip=self.trip, seat_no=1, blocked=True, note="broken")
+        self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 3}, format="json")
+        self.assertEqual(TripOccupancy.objects.get(trip=self.trip).free_count, 0)
+
+        exception.delete()
+        self.assertEqual(TripSeat.objects.filter(trip=self.trip).count(), 0)
+        r = self.client.post(reverse("trip-reserve", args=[self.trip.id]), {"quantity": 1}, format="json")
+        self.assertEqual(r.status_code, 201)
+        self.assertEqual(r.data["assigned_seats"], [1])
+
+
+class TestCompactTripSeats(TestCase):
+    def test_compaction_keeps_exception_rows_without_loading_seats(self):
+        bt = BusType.objects.create(name="Mini", seats_count=4)
+        trip = Trip.objects.create(
+            trip_date=date.today(), origin="A", destination="B", bus=Bus.objects.create(plate="B21", bus_type=bt)
+        )
+        seat = TripSeat.objects.get(trip=trip, seat_no=2)
+        seat.blocked = True
+        seat.save()
+        TripSeat.objects.filter(trip=trip, seat_no=3).update(note="window cracked")
+
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("compact_trip_seats", stdout=io.StringIO())
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse([q for q in sql if q.startswith("SELECT") and "trips_tripseat" in q])
+        self.assertEqual(list(TripSeat.objects.filter(trip=trip).values_list("seat_no", flat=True)), [2, 3])
+        self.assertEqual(occupancy.seats(TripOccupancy.objects.get(trip=trip).blocked), [2])
+
+
+class TestTripSaveQueries(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=60)
+        self.bus = Bus.objects.create(plate="B19", bus_type=bt)
+        self.other = Bus.objects.create(plate="B20", bus_type=BusType.objects.create(name="Midi", seats_count=30))
+
+    def test_update_without_bus_change_is_one_query(self):
+        trip = Trip.objects.create(trip_date=date.today(), origin="A", destination="B", bus=self.bus)
+        trip = Trip.objects.get(pk=trip.pk)
+        trip.destination = "C"
+        with patch("apps.trips.signals.push"), patch("apps.trips.signals.push_dashboard"):
+            with self.assertNumQueries(1):
+                trip.save()
+        trip.bus = self.other
+        trip.save()
+        self.assertEqual(TripSeat.objects.filter(trip=trip).count(), 30)
+        self.assertEqual(TripOccupancy.objects.get(trip=trip).capacity, 30)
+
+    def test_bulk_create_queries_do_not_grow_with_trips(self):
+        def create(n):
+            trips = [
+                Trip(trip_date=date.today(), origin="A", destination=f"D{i}", bus=self.bus if i % 2 else self.other)
+                for i in range(n)
+            ]
+            with CaptureQueriesContext(connection) as ctx:
+                Trip.objects.bulk_create_with_seats(trips)
+            return len(ctx)
+
+        self.assertEqual(create(5), create(50))
+        self.assertEqual(TripSeat.objects.count(), 27 * 60 + 28 * 30)
+        self.assertEqual(TripOccupancy.objects.filter(capacity=60).count(), 27)
+
+
+class TestTripStreamingImport(TestCase):
+    def setUp(self):
+        bt = BusType.objects.create(name="Mini", seats_count=3)
+        self.bus = Bus.objects.create(plate="B21", bus_type=bt)
+        self.user = get_user_model().objects.create_user("si", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_chunked_import_with_error_report(self):
+        today = date.today()
+        rows = ["destination,trip_date,origin,bus"]
+        rows += [f"D{i},{today},O,{self.bus.id}" for i in range(7)]
+        rows += ["Bad,not-a-date,O,", f"Ghost,{today},O,00000000-0000-0000-0000-000000000000", f"NoBus,{today},O,"]
+        file = SimpleUploadedFile("trips.csv", "\n".join(rows).encode(), content_type="text/csv")
+        with patch("apps.trips.signals.push") as mock_push, patch("apps.trips.views.push_dashboard") as mock_dash:
+            with patch("apps.trips.imports.CHUNK_SIZE", 3):
+                resp = self.client.post(reverse("trip-import"), {"file": file}, format="multipart")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data["created"], 8)
+        self.assertEqual([e["row"] for e in resp.data["errors"]], [9, 10])
+        self.assertIn("trip_date", resp.data["errors"][0]["errors"])
+        self.assertIn("bus", resp.data["errors"][1]["errors"])
+        self.assertEqual(TripSeat.objects.filter(trip__bus=self.bus).count(), 21)
+        self.assertFalse(mock_push.called)
+        mock_dash.assert_called_once_with({"type": "trips.imported", "created": 8})
+
+    def test_decode_error_after_first_chunk_imports_nothing(self):
+        rows = ["trip_date,origin,destination"] + [f"{date.today()},A,B{i}" for i in range(5)]
+        data = "\n".join(rows).encode() + b"\n2030-01-01,A,\xff\n"
+        file = SimpleUploadedFile("trips.csv", data, content_type="text/csv")
+        with patch("apps.trips.views.push_dashboard") as mock_dash, patch("apps.trips.imports.CHUNK_SIZE", 2):
+            resp = self.client.post(reverse("trip-import"), {"file": file}, format="multipart")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(Trip.objects.exists())
+        self.assertFalse(mock_dash.called)
+
+
+class TestStreamingExport(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("se", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_csv_export_streams_rows(self):
+        Trip.objects.create(trip_date=date(2030, 1, 2), origin="A", destination="B")
+        Trip.objects.create(trip_date=date(2030, 1, 1), origin="C", destination="D,E")
+        with patch("apps.streaming.BUFFER_BYTES", 1):
+            resp = self.client.get(reverse("trip-export") + "?format=csv")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.streaming)
+        rows = list(csv.reader(b"".join(resp.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ["ID", "Date", "Origin", "Destination"])
+        self.assertEqual([r[1:] for r in rows[1:]], [["2030-01-02", "A", "B"], ["2030-01-01", "C", "D,E"]])
+
+    def test_json_and_ndjson_export_stream_in_chunks(self):
+        for i in range(5):
+            Trip.objects.create(trip_date=date(2030, 1, 1 + i), origin="A", destination=f"D{i}")
+        with patch("apps.streaming.CURSOR_CHUNK_SIZE", 2):
+            resp = self.client.get(reverse("trip-export") + "?format=json")
+            self.assertEqual(resp["Content-Type"], "application/json")
+            data = json.loads(b"".join(resp.streaming_content))
+            self.assertEqual([t["destination"] for t in data], ["D4", "D3", "D2", "D1", "D0"])
+            self.assertIn("links", data[0])
+
+            resp = self.client.get(reverse("trip-export") + "?format=ndjson&gzip=1")
+            self.assertEqual(resp["Content-Type"], "application/gzip")
+            self.assertIn("trips.ndjson.gz", resp["Content-Disposition"])
+            lines = gzip.decompress(b"".join(resp.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)["destination"] for line in lines], ["D4", "D3", "D2", "D1", "D0"])
+
+    def test_asgi_request_gets_async_iterator(self):
+        resp = streaming_response(AsyncRequestFactory().get("/"), csv_chunks(["a"], [[1], [2]]), "text/csv", "x.csv")
+        self.assertTrue(resp.is_async)
+
+        async def consume():
+            return b"".join([chunk async for chunk in resp.streaming_content])
+
+        self.assertEqual(async_to_sync(consume)(), b"a\r\n1\r\n2\r\n")
+
+
+class TestLinkBuilder(SimpleTestCase):
+    def test_links_match_reverse_and_can_be_dropped(self):
+        trip = Trip(trip_date=date(2030, 1, 1), origin="A", destination="B")
+        request = APIRequestFactory().get("/api/trips/")
+        data = TripSerializer(trip, context={"request": Request(request)}).data
+        report = request.build_absolute_uri(reverse("trip-report", args=[trip.id]))
+        self.assertEqual(data["links"]["api.self"], request.build_absolute_uri(reverse("trip-detail", args=[trip.id])))
+        self.assertEqual(
+            data["links"]["api.manifest.csv"], request.build_absolute_uri(reverse("export_manifest", args=[trip.id]))
+        )
+        self.assertEqual(data["links"]["api.report.json"], f"{report}?format=json")
+        self.assertEqual(TripSerializer(trip).data["links"]["api.self"], "")
+
+        opted_out = Request(APIRequestFactory().get("/api/trips/?links=0"))
+        self.assertNotIn("links", TripSerializer([trip], many=True, context={"request": opted_out}).data[0])
@@ -3,6 +3,9 @@ from django.http import HttpResponse, Http404
 from rest_framework.decorators import api_view
 from django.shortcuts import get_object_or_404
 from django.db.models import Prefetch
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
 import csv
 import json
 from rest_framework.decorators import action
@@ -11,53 +14,34 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 
 from .serializers import TripSerializer, ReservationSerializer, SeatAssignmentSerializer
-from .models import Trip, TripSeat, SeatAssignment, Reservation
+from .models import Trip, SeatAssignment, Reservation
+from .allocation import AllocationConflict, MODES as ALLOCATION_MODES
+from .imports import import_trips
+from .manifest import HEADER as MANIFEST_HEADER, load_manifest, zip_entries as manifest_zip_entries
+from . import occupancy, stats as trip_stats
 from apps.people.models import Client
+from apps.projection import ProjectedListMixin
+from apps.streaming import (
+    CURSOR_CHUNK_SIZE, EXPORT_RENDERERS, JSON_CONTENT_TYPES,
+    serialized_rows, streaming_csv, streaming_json, streaming_response, zip_chunks,
+)
 from .signals import push, push_dashboard
 
 
 def export_manifest(request, trip_id):
     trip = get_object_or_404(Trip, pk=trip_id)
+    manifest = load_manifest(trip)
 
     response = HttpResponse(content_type="text/csv")
-    response[
-        "Content-Disposition"
-    ] = f'attachment; filename=manifest_{trip.trip_date}_{trip.destination}_{trip.id}.csv'
+    response["Content-Disposition"] = f"attachment; filename={manifest.filename}"
 
     writer = csv.writer(response)
-    writer.writerow(["Seat", "FirstName", "LastName", "Phone", "PassportID", "Pickup", "Status"])
-
-    assignments = {
-        a.seat_no: a
-        for a in (
-            SeatAssignment.objects.filter(trip=trip)
-            .select_related("passenger_client")
-            .prefetch_related("passenger_client__phones")
-        )
-    }
-
-    for seat in TripSeat.objects.filter(trip=trip).order_by("seat_no"):
-        a = assignments.get(seat.seat_no)
-        if a:
-            client = a.passenger_client
-            fn = a.first_name or (client.first_name if client else "") or ""
-            ln = a.last_name or (client.last_name if client else "") or ""
-            phone = a.phone or (
-                (client.phones.filter(is_primary=True).first() or client.phones.first()).e164
-                if client and client.phones.exists()
-                else ""
-            )
-            passport = a.passport_id or (client.passport_id if client else "") or ""
-            status = a.status
-        else:
-            fn = ln = phone = passport = status = ""
-
-        writer.writerow([seat.seat_no, fn, ln, phone, passport, "", status])
-
+    writer.writerow(MANIFEST_HEADER)
+    writer.writerows(manifest.rows())
     return response
 
 
-class TripViewSet(viewsets.ModelViewSet):
+class TripViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Trip.objects.all().order_by("-trip_date")
     serializer_class = TripSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
@@ -93,44 +77,30 @@ class TripViewSet(viewsets.ModelViewSet):
         data = SeatAssignmentSerializer(assignments, many=True).data
         return Response(data)
 
-    @action(detail=False, methods=["get"], url_path="export", url_name="export")
+    @action(detail=False, methods=["get"], url_path="export", url_name="export", renderer_classes=EXPORT_RENDERERS)
     def export(self, request):
         fmt = request.query_params.get("format", "json")
         qs = self.get_queryset()
         if fmt == "csv":
-            resp = HttpResponse(content_type="text/csv")
-            resp["Content-Disposition"] = "attachment; filename=trips.csv"
-            writer = csv.writer(resp)
-            writer.writerow(["ID", "Date", "Origin", "Destination"])
-            for t in qs:
-                writer.writerow([t.id, t.trip_date, t.origin, t.destination])
-            return resp
-        data = TripSerializer(qs, many=True, context={"request": request}).data
-        if fmt == "json":
-            resp = HttpResponse(json.dumps(data, default=str), content_type="application/json")
-            resp["Content-Disposition"] = "attachment; filename=trips.json"
-            return resp
-        return Response(data)
+            rows = qs.values_list("id", "trip_date", "origin", "destination").iterator(chunk_size=CURSOR_CHUNK_SIZE)
+            return streaming_csv(request, "trips.csv", ["ID", "Date", "Origin", "Destination"], rows)
+        if fmt in JSON_CONTENT_TYPES:
+            rows = serialized_rows(TripSerializer, qs, {"request": request})
+            return streaming_json(request, "trips", fmt, rows)
+        return Response(TripSerializer(qs, many=True, context={"request": request}).data)
 
     @action(detail=False, methods=["post"], url_path="import", url_name="import")
     def import_csv(self, request):
         file = request.FILES.get("file")
         if not file:
             return Response({"detail": "file required"}, status=400)
-        decoded = file.read().decode()
-        reader = csv.DictReader(decoded.splitlines())
-        created = 0
-        for row in reader:
-            Trip.objects.create(
-                destination=row.get("destination", ""),
-                trip_date=row.get("trip_date"),
-                origin=row.get("origin", ""),
-                bus_id=row.get("bus"),
-            )
-            created += 1
+        try:
+            created, errors = import_trips(file)
+        except UnicodeDecodeError:
+            return Response({"detail": "file must be UTF-8 encoded CSV"}, status=400)
         if created:
-            push_dashboard({"type": "data.changed"})
-        return Response({"created": created})
+            push_dashboard({"type": "trips.imported", "created": created})
+        return Response({"created": created, "errors": errors})
 
     @action(detail=False, methods=["post"], url_path="bulk", url_name="bulk")
     def bulk(self, request):
@@ -144,35 +114,18 @@ class TripViewSet(viewsets.ModelViewSet):
             push_dashboard({"type": "data.changed"})
             return Response({"processed": count})
         elif action == "export_manifests":
-            import io, zipfile
-            buffer = io.BytesIO()
-            with zipfile.ZipFile(buffer, "w") as z:
-                for trip in qs:
-                    response = export_manifest(request, trip.id)
-                    z.writestr(f"manifest_{trip.id}.csv", response.content.decode())
-            resp = HttpResponse(buffer.getvalue(), content_type="application/zip")
-            resp["Content-Disposition"] = "attachment; filename=manifests.zip"
-            return resp
+            chunks = zip_chunks(manifest_zip_entries(qs.order_by("trip_date", "id")))
+            return streaming_response(request, chunks, "application/zip", "manifests.zip")
         else:
             return Response({"detail": "invalid action"}, status=400)
 
     @action(detail=True, methods=["get"], url_path="report", url_name="report")
     def report(self, request, pk=None):
         trip = self.get_object()
-        total = TripSeat.objects.filter(trip=trip).count()
-        booked = SeatAssignment.objects.filter(trip=trip).count()
-        available = TripSeat.objects.filter(trip=trip, blocked=False).count() - booked
-        cancellations = Reservation.objects.filter(trip=trip, status="CANCELLED").count()
-        stats = {
-            "total": total,
-            "booked": booked,
-            "available": available,
-            "cancellations": cancellations,
-        }
-        manifest = SeatAssignmentSerializer(
-            SeatAssignment.objects.filter(trip=trip), many=True
-        ).data
-        data = {"stats": stats, "manifest": manifest}
+        data = {"stats": trip_stats.for_trip(trip.pk)}
+        if request.query_params.get("stats_only", "").lower() not in ("1", "true", "yes"):
+            loaded = load_manifest(trip, passengers=False)
+            data["manifest"] = SeatAssignmentSerializer(loaded.assignments, many=True).data
         if request.query_params.get("format") == "json":
             resp = HttpResponse(
                 json.dumps(data, default=str), content_type="application/json"
@@ -189,33 +142,42 @@ class TripViewSet(viewsets.ModelViewSet):
         quantity = int(request.data.get("quantity", 0))
         if quantity <= 0:
             return Response({"detail": "quantity required"}, status=status.HTTP_400_BAD_REQUEST)
+        mode = request.data.get("allocation", "linear")
+        if mode not in ALLOCATION_MODES:
+            return Response({"detail": "invalid allocation"}, status=status.HTTP_400_BAD_REQUEST)
+        override = request.headers.get("X-Manager-Override", "false").lower() == "true"
+        if quantity > occupancy.for_trip(trip.pk).free_count and not override:
+            return Response({"detail": "not enough seats"}, status=status.HTTP_409_CONFLICT)
         contact_id = request.data.get("contact_client_id")
         notes = request.data.get("notes", "")
         contact = None
         if contact_id:
             contact = get_object_or_404(Client, pk=contact_id)
+        hold_minutes = settings.RESERVATION_HOLD_MINUTES
         reservation = Reservation.objects.create(
             trip=trip,
             contact_client=contact,
             quantity=quantity,
             notes=notes,
+            hold_expires_at=timezone.now() + timedelta(minutes=hold_minutes) if hold_minutes else None,
             created_by=request.user,
             updated_by=request.user,
         )
-        reservation.allocate_seats()
+        try:
+            reservation.allocate_seats(mode)
+        except AllocationConflict:
+            reservation.delete()
+            return Response({"detail": "seat allocation conflict, retry"}, status=status.HTTP_409_CONFLICT)
         assigned = list(
             SeatAssignment.objects.filter(reservation=reservation).values_list("seat_no", flat=True)
         )
-        free_count = TripSeat.objects.filter(trip=trip, blocked=False).count() - len(
-            SeatAssignment.objects.filter(trip=trip)
-        )
-        if len(assigned) < quantity and request.headers.get("X-Manager-Override", "false").lower() != "true":
+        if len(assigned) < quantity and not override:
             reservation.delete()
             return Response({"detail": "not enough seats"}, status=status.HTTP_409_CONFLICT)
         return Response({"reservation_id": str(reservation.id), "assigned_seats": assigned}, status=status.HTTP_201_CREATED)
 
 
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     http_method_names = ["patch", "get"]
@@ -263,7 +225,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
             current = SeatAssignment.objects.filter(reservation=reservation)
             diff = new_q - current.count()
             if diff > 0:
-                reservation.allocate_seats()
+                try:
+                    reservation.allocate_seats()
+                except AllocationConflict:
+                    return Response({"detail": "seat allocation conflict, retry"}, status=status.HTTP_409_CONFLICT)
                 if SeatAssignment.objects.filter(reservation=reservation).count() < new_q and request.headers.get("X-Manager-Override", "false").lower() != "true":
                     return Response({"detail": "not enough seats"}, status=status.HTTP_409_CONFLICT)
             elif diff < 0:
@@ -277,7 +242,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
         return Response({"reservation_id": str(reservation.id), "assigned_seats": assigned})
 
 
-class SeatAssignmentViewSet(viewsets.ModelViewSet):
+class SeatAssignmentViewSet(ProjectedListMixin, viewsets.ModelViewSet):
     queryset = SeatAssignment.objects.all()
     serializer_class = SeatAssignmentSerializer
     http_method_names = ["patch", "get"]
@@ -289,7 +254,7 @@ class SeatAssignmentViewSet(viewsets.ModelViewSet):
             new_seat = int(data["seat_no"])
             if SeatAssignment.objects.filter(trip=assignment.trip, seat_no=new_seat).exclude(id=assignment.id).exists():
                 return Response({"detail": "seat taken"}, status=status.HTTP_409_CONFLICT)
-            if not TripSeat.objects.filter(trip=assignment.trip, seat_no=new_seat, blocked=False).exists():
+            if not occupancy.for_trip(assignment.trip_id).is_bookable(new_seat):
                 return Response({"detail": "seat invalid"}, status=status.HTTP_400_BAD_REQUEST)
             assignment.seat_no = new_seat
         if "passenger_client_id" in data:
@@ -113,6 +113,14 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Cache: same Redis, separate database from the channel layer (dashboard responses, report stats)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": env("CACHE_URL", default=f"redis://{REDIS_HOST}:{REDIS_PORT}/1"),
+    }
+}
+
 WSGI_APPLICATION = "astraion.wsgi.application"  # still needed for admin commands
 
 
@@ -154,6 +162,8 @@ LANGUAGE_CODE = "en-us"
 TIME_ZONE = "Europe/Skopje"
 USE_I18N = True
 USE_TZ = True
+# Region assumed for phone numbers entered without a country code
+PHONE_DEFAULT_REGION = env("PHONE_DEFAULT_REGION", default="MK")
 
 
 # Static files (CSS, JavaScript, Images)
@@ -169,7 +179,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # DRF
 REST_FRAMEWORK = {
     "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.CursorPagination",
+    "DEFAULT_PAGINATION_CLASS": "apps.pagination.QuerysetOrderedCursorPagination",
     "PAGE_SIZE": 50,
 }
 
@@ -181,3 +191,11 @@ CORS_ALLOW_CREDENTIALS = True
 CSRF_TRUSTED_ORIGINS = [o.replace("http://", "http://").replace("https://", "https://") for o in CORS_ALLOWED_ORIGINS]
 
 FRONTEND_BASE_URL = os.getenv("FRONTEND_BASE_URL", "http://localhost:5173")
+
+# Reservations created through /reserve stay on HOLD this long before
+# `manage.py expire_holds` cancels them; 0 disables expiry.
+RESERVATION_HOLD_MINUTES = env.int("RESERVATION_HOLD_MINUTES", default=0)
+
+# Store TripSeat rows only for blocked/annotated seats; the rest of the
+# layout is derived from the bus type capacity (see TripSeat.layout).
+SPARSE_TRIP_SEATS = env.bool("SPARSE_TRIP_SEATS", default=False)
@@ -25,7 +25,10 @@ export default function ActivityFeed() {
     ws.onmessage = (e) => {
       try {
         const data = JSON.parse(e.data);
-        if (data.type === 'client.tagged' || data.type === 'client.note.added') {
+        if (data.type === 'client.bulk' && data.action === 'tags') {
+          // bulk tagging sends one event; its per-client rows are in the feed
+          fetchFeed();
+        } else if (data.type === 'client.tagged' || data.type === 'client.note.added') {
           const evt: Event = {
             id: crypto.randomUUID(),
             type: data.type,
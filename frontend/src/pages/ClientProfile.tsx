@@ -40,6 +40,7 @@ export default function ClientProfile({ id }: { id: string }) {
   const [client, setClient] = useState<Client | null>(null);
   const [reservations, setReservations] = useState<Reservation[]>([]);
   const [history, setHistory] = useState<HistoryItem[]>([]);
+  const [historyNext, setHistoryNext] = useState<string | null>(null);
   const [notes, setNotes] = useState<Note[]>([]);
   const [newTag, setNewTag] = useState("");
   const [noteAuthor, setNoteAuthor] = useState("");
@@ -63,10 +64,19 @@ export default function ClientProfile({ id }: { id: string }) {
           .catch(() => setReservations([]));
       }
     });
+  type HistoryPage = { trips: HistoryItem[]; next: string | null };
   const fetchHistory = () =>
-    api<{ trips: HistoryItem[] }>(`/api/clients/${id}/history/`).then((d) =>
-      setHistory(d.trips)
-    );
+    api<HistoryPage>(`/api/clients/${id}/history/`).then((d) => {
+      setHistory(d.trips);
+      setHistoryNext(d.next);
+    });
+  const loadMoreHistory = () => {
+    if (!historyNext) return;
+    api<HistoryPage>(historyNext).then((d) => {
+      setHistory((h) => [...h, ...d.trips]);
+      setHistoryNext(d.next);
+    });
+  };
   const fetchNotes = () =>
     api<Note[]>(`/api/clients/${id}/notes/`).then(setNotes);
 
@@ -285,6 +295,9 @@ export default function ClientProfile({ id }: { id: string }) {
                   ))}
                 </tbody>
               </table>
+              {historyNext && (
+                <button className="text-sm text-primary" onClick={loadMoreHistory}>Load more</button>
+              )}
             </div>
           )}
         </div>